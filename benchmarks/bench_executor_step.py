@@ -0,0 +1,105 @@
+"""Measure the per-step overhead of the GraphExecutor on the braille network.
+
+Usage:
+
+    python benchmarks/bench_executor_step.py [--steps 2000] [--batch 1]
+
+The braille graph is small (a handful of nodes with 12 -> 38 -> 7 neurons), so the
+time per step is dominated by Python overhead rather than by the tensor operations. To
+isolate the overhead of the executor itself, the graph is additionally run with
+pass-through modules that do no work.
+"""
+import argparse
+import pathlib
+import time
+from typing import Optional, Tuple
+
+import nir
+import torch
+
+import nirtorch
+
+BRAILLE_PATH = pathlib.Path(__file__).parent.parent / "tests" / "braille.nir"
+
+
+class CubaLIF(torch.nn.Module):
+    """Minimal current-based LIF neuron, used as a stateful stand-in module."""
+
+    def __init__(self, node: nir.CubaLIF):
+        super().__init__()
+        self.register_buffer("tau_mem", torch.as_tensor(node.tau_mem).float())
+        self.register_buffer("tau_syn", torch.as_tensor(node.tau_syn).float())
+        self.register_buffer("v_threshold", torch.as_tensor(node.v_threshold).float())
+
+    def forward(
+        self, x: torch.Tensor, state: Optional[Tuple[torch.Tensor, torch.Tensor]] = None
+    ):
+        if state is None:
+            state = (torch.zeros_like(x), torch.zeros_like(x))
+        v, i = state
+        i = i + (x - i) / self.tau_syn
+        v = v + (i - v) / self.tau_mem
+        z = (v > self.v_threshold).to(x.dtype)
+        v = v * (1 - z)
+        return z, (v, i)
+
+
+class PassThrough(torch.nn.Module):
+    """Stateful module that does no work, to measure the overhead of the executor."""
+
+    def forward(self, x: torch.Tensor, state: Optional[torch.Tensor] = None):
+        return x, x
+
+
+def model_map(node: nir.NIRNode) -> torch.nn.Module:
+    if isinstance(node, nir.Affine):
+        lin = torch.nn.Linear(*node.weight.shape[-2:][::-1])
+        lin.weight.data = torch.as_tensor(node.weight).float()
+        lin.bias.data = torch.as_tensor(node.bias).float()
+        return lin
+    elif isinstance(node, nir.CubaLIF):
+        return CubaLIF(node)
+    elif isinstance(node, (nir.Input, nir.Output)):
+        return torch.nn.Identity()
+    raise NotImplementedError(f"Unsupported node {node}")
+
+
+def passthrough_model_map(node: nir.NIRNode) -> torch.nn.Module:
+    if isinstance(node, nir.CubaLIF):
+        return PassThrough()
+    return torch.nn.Identity()
+
+
+def time_steps(executor: torch.nn.Module, data: torch.Tensor, steps: int) -> float:
+    """Return the mean wall time per step in seconds."""
+    state = None
+    with torch.no_grad():
+        # Warm up
+        for _ in range(10):
+            _, state = executor(data, state)
+        start = time.perf_counter()
+        for _ in range(steps):
+            _, state = executor(data, state)
+        return (time.perf_counter() - start) / steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=1)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)
+    data = torch.rand(args.batch, 12)
+    for label, mapping in [("modules", model_map), ("overhead", passthrough_model_map)]:
+        executor = nirtorch.load(str(BRAILLE_PATH), mapping)
+        times = [time_steps(executor, data, args.steps) for _ in range(args.repeats)]
+        print(
+            f"braille.nir ({label}): {min(times) * 1e6:.1f} us/step "
+            f"(best of {args.repeats})"
+        )
+
+
+if __name__ == "__main__":
+    main()
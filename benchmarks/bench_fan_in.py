@@ -0,0 +1,61 @@
+"""Compare ways of summing the inputs of a node with k incoming edges.
+
+Usage:
+
+    python benchmarks/bench_fan_in.py [--batch 32] [--features 1024]
+
+The executor used to sum the inputs with `torch.stack(inputs).sum(0)`, which
+materialises a [k, B, ...] tensor on every step. This is compared to the running sum of
+the `FanInAccumulator`, both into a new tensor and into a preallocated buffer of an
+`ActivationArena`, for k = 2..64.
+"""
+import argparse
+import time
+from typing import Callable, List
+
+import torch
+
+from nirtorch.arena import ActivationArena, FanInAccumulator
+
+
+def time_sum(fn: Callable[[], torch.Tensor], steps: int) -> float:
+    """Return the mean wall time per call in seconds."""
+    with torch.no_grad():
+        for _ in range(10):
+            fn()
+        start = time.perf_counter()
+        for _ in range(steps):
+            fn()
+        return (time.perf_counter() - start) / steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--features", type=int, default=1024)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)
+    accumulate = FanInAccumulator()
+    arena = ActivationArena(1)
+    print(f"{'k':>4} {'stack+sum':>12} {'accumulate':>12} {'arena':>12}  (us/call)")
+    for k in [2, 4, 8, 16, 32, 64]:
+        inputs: List[torch.Tensor] = [
+            torch.rand(args.batch, args.features) for _ in range(k)
+        ]
+        candidates = [
+            lambda: torch.stack(inputs).sum(0),
+            lambda: accumulate(inputs),
+            lambda: arena.sum(0, inputs, accumulate),
+        ]
+        times = [
+            min(time_sum(fn, args.steps) for _ in range(args.repeats))
+            for fn in candidates
+        ]
+        print(f"{k:>4} " + " ".join(f"{t * 1e6:>12.1f}" for t in times))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Compare benchmark results against a stored baseline and fail on regressions.
+
+Usage:
+
+    python benchmarks/bench_gate.py [--baseline benchmarks/baseline.json]
+                                    [--results results.json] [--update]
+
+Without `--results`, the benchmark suite (see `bench_suite.py`) is run with the
+settings of the baseline. Every measurement of the baseline is compared to the same
+benchmark and graph in the results, and a table of the differences is printed. The
+command exits with status 1 if any measurement is worse than the baseline by more than
+its tolerance, or is missing from the results.
+
+The baseline file is the JSON report of the suite with an additional "tolerances"
+entry, which maps benchmark names (or "default") to the allowed relative increase of
+every metric. For example, `{"default": {"seconds": 1.0}}` allows every benchmark to
+take up to twice as long. Metrics without a tolerance are not compared. The "slack"
+entry has the same structure and gives an absolute increase that is always allowed,
+such that small measurements, whose noise is large relative to their size, do not
+fail the gate.
+
+Timings depend on the machine, so the baseline has to be recorded on the machine that
+runs the gate, with `--update`. That keeps the tolerances and the slack of the
+existing baseline.
+"""
+import argparse
+import json
+import pathlib
+import sys
+from typing import Any, Dict, List, Tuple
+
+import bench_suite
+
+BASELINE_PATH = pathlib.Path(__file__).parent / "baseline.json"
+# Timings vary between runs, and quadratic regressions are far larger than this.
+# Memory is nearly deterministic, apart from the RSS, which depends on the allocator.
+DEFAULT_TOLERANCES = {
+    "default": {
+        "seconds": 1.0,
+        "python_peak_bytes": 0.1,
+        "python_retained_bytes": 0.1,
+        "torch_allocated_bytes": 0.1,
+    }
+}
+# The Python memory varies by a few kilobytes between runs of the same code, e.g. with
+# the objects cached by the interpreter, which exceeds the tolerance of small runs.
+DEFAULT_SLACK = {
+    "default": {
+        "python_peak_bytes": 32 * 1024,
+        "python_retained_bytes": 32 * 1024,
+    }
+}
+
+
+def compare(
+    baseline: Dict[str, Any], current: Dict[str, Any]
+) -> Tuple[List[Tuple[str, ...]], bool]:
+    """Compares the results of two reports.
+
+    Returns:
+        Tuple[List[Tuple[str, ...]], bool]: The rows of the difference table, and
+            whether any measurement regressed
+    """
+    tolerances = baseline.get("tolerances", DEFAULT_TOLERANCES)
+    slack = baseline.get("slack", DEFAULT_SLACK)
+    results = {(r["benchmark"], r["graph"]): r for r in current["results"]}
+    rows, regressed = [], False
+    for expected in baseline["results"]:
+        key = (expected["benchmark"], expected["graph"])
+        metrics = {
+            **tolerances.get("default", {}),
+            **tolerances.get(expected["benchmark"], {}),
+        }
+        allowed = {
+            **slack.get("default", {}),
+            **slack.get(expected["benchmark"], {}),
+        }
+        actual = results.get(key)
+        if actual is None:
+            rows.append((*key, "", "", "", "", "", "MISSING"))
+            regressed = True
+            continue
+        if "skipped" in expected or "skipped" in actual:
+            rows.append((*key, "", "", "", "", "", "skipped"))
+            continue
+        for metric, tolerance in metrics.items():
+            old, new = expected.get(metric), actual.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else float(new > 0)
+            limit = f"+{tolerance * 100:.0f}%"
+            if metric in allowed:
+                limit += f" or +{allowed[metric]:.4g}"
+            regressed_metric = change > tolerance and new - old > allowed.get(metric, 0)
+            status = "REGRESSION" if regressed_metric else "ok"
+            regressed |= regressed_metric
+            rows.append(
+                (
+                    *key,
+                    metric,
+                    f"{old:.4g}",
+                    f"{new:.4g}",
+                    f"{change * 100:+.1f}%",
+                    limit,
+                    status,
+                )
+            )
+    return rows, regressed
+
+
+def format_table(rows: List[Tuple[str, ...]]) -> str:
+    header = ("benchmark", "graph", "metric", "baseline", "current", "change", "limit")
+    rows = [header + ("status",), *rows]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header) + 1)]
+    return "\n".join(
+        "  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip()
+        for row in rows
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--baseline", type=pathlib.Path, default=BASELINE_PATH)
+    parser.add_argument(
+        "--results",
+        type=pathlib.Path,
+        default=None,
+        help="Results of the benchmark suite, instead of running it",
+    )
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="Store the results as the new baseline, instead of comparing them",
+    )
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if args.results is not None:
+        with open(args.results) as f:
+            current = json.load(f)
+    else:
+        current = bench_suite.run_suite(baseline["settings"])
+
+    if args.update:
+        current["tolerances"] = baseline.get("tolerances", DEFAULT_TOLERANCES)
+        current["slack"] = baseline.get("slack", DEFAULT_SLACK)
+        with open(args.baseline, "w") as f:
+            json.dump(current, f, indent=2)
+        return
+
+    rows, regressed = compare(baseline, current)
+    print(format_table(rows))
+    if regressed:
+        print("\nPerformance regressed compared to the baseline", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
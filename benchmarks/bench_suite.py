@@ -0,0 +1,423 @@
+"""Benchmark loading, extracting and executing graphs, and record the results as JSON.
+
+Usage:
+
+    python benchmarks/bench_suite.py [--output results.json] [--sizes 10,100,1000]
+
+Measured are `nirtorch.load`, `GraphExecutor.forward` (in steps per second),
+`extract_torch_graph` (with and without `modules_only`), `Graph.ignore_tensors`,
+the module filters `Graph.ignore_submodules_of` and `Graph.get_leaf_modules`, and
+`extract_nir_graph`. They run on
+`tests/braille.nir`, `tests/lif_norse.nir` and synthetic graphs of the given sizes
+(see `nirtorch.synthetic`).
+For the extraction benchmarks, the synthetic graphs are mirrored as torch models with
+the same number of modules, and the module filters run on models of nested blocks.
+
+Unless `--no-memory` is given, the memory of `extract_torch_graph` (which keeps every
+traced tensor alive as a node, unless `modules_only` is set), `nirtorch.load` and long
+executor runs is measured as
+well: the peak resident set size of the process (RSS), the peak and retained size of
+Python objects (tracemalloc) and the bytes of the tensors allocated by torch.
+
+Some operations scale quadratically with the number of nodes, so every benchmark skips
+sizes above a limit (see `--max-nodes`). Skipped measurements are recorded as well, so
+results of different commits can be compared with the same settings.
+"""
+import argparse
+import datetime
+import gc
+import json
+import pathlib
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+import nir
+import numpy as np
+import torch
+from torch.utils import _pytree as pytree
+from torch.utils._python_dispatch import TorchDispatchMode
+
+import nirtorch
+from nirtorch.graph import Graph, extract_torch_graph, named_modules_map
+from nirtorch.synthetic import SyntheticLIF, default_model_map, synthetic_graph
+
+REPO_PATH = pathlib.Path(__file__).parent.parent
+GRAPH_PATHS = {
+    "braille": REPO_PATH / "tests" / "braille.nir",
+    "lif_norse": REPO_PATH / "tests" / "lif_norse.nir",
+}
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+# The largest number of nodes every benchmark is run for by default
+DEFAULT_MAX_NODES = {
+    "load": 10000,
+    "forward": 10000,
+    "extract_torch_graph": 100000,
+    "extract_modules": 100000,
+    "ignore_tensors": 100000,
+    "module_filters": 100000,
+    "extract_nir_graph": 100000,
+    "extract_torch_graph_memory": 100000,
+    "extract_modules_memory": 100000,
+    "load_memory": 10000,
+    "run_memory": 10000,
+}
+
+
+def model_map(node: nir.NIRNode) -> torch.nn.Module:
+    if isinstance(node, nir.CubaLIF):
+        return SyntheticLIF(node.tau_mem, node.v_threshold)
+    return default_model_map(node)
+
+
+def synthetic_model(num_nodes: int, width: int = 4) -> torch.nn.Module:
+    """A torch model with as many modules as `synthetic_graph` has nodes."""
+    layers = [
+        torch.nn.Linear(width, width) if i % 2 == 0 else torch.nn.ReLU()
+        for i in range(num_nodes)
+    ]
+    return torch.nn.Sequential(*layers)
+
+
+class Block(torch.nn.Module):
+    def __init__(self, width: int) -> None:
+        super().__init__()
+        self.lin = torch.nn.Linear(width, width)
+        self.relu = torch.nn.ReLU()
+
+    def forward(self, data):
+        return self.relu(self.lin(data))
+
+
+def block_model(num_nodes: int, width: int = 4) -> torch.nn.Module:
+    """A torch model of blocks with the given number of modules in total."""
+    return torch.nn.Sequential(*[Block(width) for _ in range(num_nodes // 3)])
+
+
+def filter_modules(graph: Graph) -> None:
+    graph.ignore_submodules_of([Block])
+    graph.get_leaf_modules()
+
+
+def torch_model_map(module: torch.nn.Module) -> nir.NIRNode:
+    if isinstance(module, torch.nn.Linear):
+        return nir.Affine(module.weight.detach().numpy(), module.bias.detach().numpy())
+    return nir.Threshold(np.zeros(1))
+
+
+def measure(fn: Callable[[], Any], min_time: float, repeats: int) -> Dict[str, Any]:
+    """Calls the function until at least `min_time` seconds have passed, and returns
+    the best mean time per call over the repeats."""
+    best, calls = float("inf"), 0
+    for _ in range(repeats):
+        calls, start = 0, time.perf_counter()
+        while True:
+            fn()
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        best = min(best, elapsed / calls)
+    return {"seconds": best, "calls": calls}
+
+
+def _read_status(field: str) -> Optional[int]:
+    """Reads a memory field in kB from /proc/self/status (Linux only) in bytes."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss() -> bool:
+    """Resets the peak RSS of the process, which is only supported on Linux."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class AllocationCounter(TorchDispatchMode):
+    """Counts the bytes of the new tensor storages created by torch operations.
+
+    Outputs that share the storage of an input (views and in-place operations) are not
+    counted. Unlike the memory profiler of torch, this does not record every operation,
+    so it can be used for long runs.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.bytes = 0
+
+    def __torch_dispatch__(self, func, types, args=(), kwargs=None):
+        out = func(*args, **(kwargs or {}))
+        inputs = {
+            x.untyped_storage().data_ptr()
+            for x in pytree.tree_leaves((args, kwargs))
+            if isinstance(x, torch.Tensor)
+        }
+        for x in pytree.tree_leaves(out):
+            if isinstance(x, torch.Tensor):
+                storage = x.untyped_storage()
+                if storage.data_ptr() not in inputs:
+                    inputs.add(storage.data_ptr())
+                    self.bytes += storage.nbytes()
+        return out
+
+
+def measure_memory(fn: Callable[[], Any]) -> Dict[str, Any]:
+    """Calls the function once and measures its memory usage, while its result is
+    alive. The function is called once before, to exclude one-time costs such as lazy
+    imports. The retained size is measured after a garbage collection.
+
+    If the peak RSS cannot be reset (outside of Linux), it is the peak of the whole
+    process so far and `rss_growth_bytes` is not measured.
+    """
+    with AllocationCounter():
+        fn()
+    gc.collect()
+    resettable = _reset_peak_rss()
+    rss_before = _read_status("VmRSS") if resettable else None
+    with AllocationCounter() as counter:
+        tracemalloc.start()
+        result = fn()
+        python_peak = tracemalloc.get_traced_memory()[1]
+        # Exclude garbage and the free lists of the interpreter, which depend on
+        # when the garbage collector last ran
+        gc.collect()
+        python_retained = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    peak_rss = _read_status("VmHWM") if resettable else None
+    if peak_rss is None:
+        import resource
+
+        # Kilobytes on Linux, bytes on macOS
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform != "darwin":
+            peak_rss *= 1024
+    del result
+    return {
+        "peak_rss_bytes": peak_rss,
+        "rss_growth_bytes": peak_rss - rss_before if rss_before is not None else None,
+        "python_peak_bytes": python_peak,
+        "python_retained_bytes": python_retained,
+        "torch_allocated_bytes": counter.bytes,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=REPO_PATH,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(
+    sizes: List[int],
+    max_nodes: Dict[str, int],
+    min_time: float,
+    repeats: int,
+    memory_steps: Optional[int],
+) -> List[Dict[str, Any]]:
+    graphs = {name: nir.read(str(path)) for name, path in GRAPH_PATHS.items()}
+    graphs.update({f"synthetic_{n}": synthetic_graph(n, fan_in=2) for n in sizes})
+    models = {f"synthetic_{n}": (synthetic_model(n), torch.rand(1, 4)) for n in sizes}
+    results = []
+
+    def record(benchmark: str, graph: str, num_nodes: int, fn: Callable[[], Any]):
+        result = {"benchmark": benchmark, "graph": graph, "nodes": num_nodes}
+        if num_nodes > max_nodes[benchmark]:
+            result["skipped"] = f"more than {max_nodes[benchmark]} nodes"
+            summary = "skipped"
+        elif benchmark.endswith("_memory"):
+            result.update(measure_memory(fn))
+            summary = f"{result['python_peak_bytes'] / 2**20:.3f} MB (Python peak)"
+        else:
+            result.update(measure(fn, min_time, repeats))
+            summary = f"{result['seconds'] * 1e3:.3f} ms"
+        results.append(result)
+        print(f"{benchmark:>26} {graph:>18} {summary:>30}", file=sys.stderr)
+        return result
+
+    def run_steps(executor: torch.nn.Module, data: torch.Tensor, steps: int):
+        state = None
+        with torch.no_grad():
+            for _ in range(steps):
+                _, state = executor(data, state)
+        return state
+
+    for name, graph in graphs.items():
+        num_nodes = len(graph.nodes)
+        record("load", name, num_nodes, lambda: nirtorch.load(graph, model_map))
+        if num_nodes > max_nodes["forward"]:
+            record("forward", name, num_nodes, None)
+            continue
+        executor = nirtorch.load(graph, model_map)
+        data = torch.rand(1, _input_size(graph))
+        state = executor(data)[1]
+
+        def step():
+            with torch.no_grad():
+                executor(data, state)
+
+        result = record("forward", name, num_nodes, step)
+        result["steps_per_second"] = 1 / result["seconds"]
+
+    for name, graph in graphs.items() if memory_steps is not None else []:
+        num_nodes = len(graph.nodes)
+        record("load_memory", name, num_nodes, lambda: nirtorch.load(graph, model_map))
+        if num_nodes > max_nodes["run_memory"]:
+            record("run_memory", name, num_nodes, None)
+            continue
+        executor = nirtorch.load(graph, model_map)
+        data = torch.rand(1, _input_size(graph))
+        record(
+            "run_memory",
+            name,
+            num_nodes,
+            lambda: run_steps(executor, data, memory_steps),
+        )
+
+    for name, (model, data) in models.items():
+        num_nodes = len(model)
+        record(
+            "extract_torch_graph",
+            name,
+            num_nodes,
+            lambda: extract_torch_graph(model, data, model_name=None),
+        )
+        record(
+            "extract_modules",
+            name,
+            num_nodes,
+            lambda: extract_torch_graph(
+                model, data, model_name=None, modules_only=True
+            ),
+        )
+        graph = (
+            extract_torch_graph(model, data, model_name=None)
+            if num_nodes <= max_nodes["ignore_tensors"]
+            else None
+        )
+        record("ignore_tensors", name, num_nodes, lambda: graph.ignore_tensors())
+        blocks = Graph(named_modules_map(block_model(num_nodes), model_name=None), [])
+        record("module_filters", name, num_nodes, lambda: filter_modules(blocks))
+        record(
+            "extract_nir_graph",
+            name,
+            num_nodes,
+            lambda: nirtorch.extract_nir_graph(model, torch_model_map, data),
+        )
+        if memory_steps is not None:
+            record(
+                "extract_torch_graph_memory",
+                name,
+                num_nodes,
+                lambda: extract_torch_graph(model, data, model_name=None),
+            )
+            record(
+                "extract_modules_memory",
+                name,
+                num_nodes,
+                lambda: extract_torch_graph(
+                    model, data, model_name=None, modules_only=True
+                ),
+            )
+    return results
+
+
+def _input_size(graph: nir.NIRGraph) -> int:
+    input_type = graph.nodes["input"].input_type
+    return int(np.prod(next(iter(input_type.values()))))
+
+
+def run_suite(settings: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs all benchmarks with the given settings (see `main` for their meaning) and
+    returns the report with the results, the settings and metadata."""
+    torch.set_num_threads(1)
+    settings = {
+        **settings,
+        "max_nodes": {**DEFAULT_MAX_NODES, **settings["max_nodes"]},
+    }
+    results = run(
+        settings["sizes"],
+        settings["max_nodes"],
+        settings["min_time"],
+        settings["repeats"],
+        settings["memory_steps"],
+    )
+    return {
+        "metadata": {
+            "commit": git_commit(),
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "nir": getattr(nir, "__version__", None),
+            "platform": platform.platform(),
+        },
+        "settings": settings,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", type=pathlib.Path, default=None)
+    parser.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES))
+    parser.add_argument(
+        "--max-nodes",
+        type=int,
+        default=None,
+        help="Run every benchmark up to this number of nodes, instead of the "
+        "default limits per benchmark",
+    )
+    parser.add_argument("--min-time", type=float, default=0.2)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument(
+        "--memory-steps",
+        type=int,
+        default=1000,
+        help="The number of steps of the executor runs for the memory benchmarks",
+    )
+    parser.add_argument("--no-memory", action="store_true")
+    args = parser.parse_args()
+
+    sizes = [int(n) for n in args.sizes.split(",")]
+    max_nodes = {
+        benchmark: args.max_nodes if args.max_nodes is not None else limit
+        for benchmark, limit in DEFAULT_MAX_NODES.items()
+    }
+    memory_steps = None if args.no_memory else args.memory_steps
+    report = run_suite(
+        {
+            "sizes": sizes,
+            "max_nodes": max_nodes,
+            "min_time": args.min_time,
+            "repeats": args.repeats,
+            "memory_steps": memory_steps,
+        }
+    )
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
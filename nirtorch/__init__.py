@@ -1,3 +1,4 @@
+from .adapters import ModuleAdapter, register_adapter  # noqa F401
 from .from_nir import load  # noqa F401
 from .graph import extract_torch_graph  # noqa F401
 from .to_nir import extract_nir_graph  # noqa F401
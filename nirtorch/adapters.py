@@ -0,0 +1,134 @@
+import inspect
+from typing import Any, List, Optional, Tuple
+
+import torch.nn as nn
+
+
+class ModuleAdapter:
+    """Defines how the `GraphExecutor` calls a module and handles its state.
+
+    A stateful module is called as `module(input, *state)`, where the state is omitted
+    in the first step, and returns `(output, *state)`. The returned state is stored and
+    passed back in the next step. If `state_is_output` is True, the whole returned
+    tuple, including the output, is stored as state instead.
+
+    The adapter of a module is resolved once per node when the graph is compiled (see
+    `get_adapter`), so the checks can be arbitrarily expensive. Custom modules that do
+    not follow the convention of their framework can be supported by registering an
+    adapter with `register_adapter`.
+
+    Modules with a different calling convention, such as a keyword argument or a
+    single state object, can override `call` and `split`. The state returned by
+    `split` is passed to `call` in the next step as it is, and may be any (nested)
+    structure of tensors.
+
+    The default adapter treats a module as stateful if its forward method has a
+    `state` argument besides the input.
+    """
+
+    def matches(self, module: nn.Module) -> bool:
+        """Returns whether the adapter applies to the module."""
+        return True
+
+    def is_stateful(self, module: nn.Module) -> bool:
+        """Returns whether the module takes and returns a state."""
+        signature = inspect.signature(module.forward)
+        return "state" in signature.parameters and len(signature.parameters) > 1
+
+    def state_is_output(self, module: nn.Module) -> bool:
+        """Returns whether the state includes the output of the module."""
+        return False
+
+    def call(self, module: nn.Module, input: Any, state: Optional[Any]) -> Any:
+        """Calls a stateful module with its input and the state returned by `split` in
+        the previous step, which is None in the first step."""
+        if state is None:
+            return module(input)
+        return module(input, *state)
+
+    def split(self, module: nn.Module, output: Any) -> Tuple[Any, Any]:
+        """Splits the value returned by a stateful module into its output and the state
+        to store."""
+        if self.state_is_output(module):
+            return output[0], output
+        return output[0], output[1:]
+
+
+class _FrameworkAdapter(ModuleAdapter):
+    """Applies to the modules defined in a package, without importing it."""
+
+    package: str = ""
+
+    def matches(self, module: nn.Module) -> bool:
+        return type(module).__module__.split(".")[0] == self.package
+
+
+class SnnTorchAdapter(_FrameworkAdapter):
+    """snnTorch neurons take the state as extra arguments unless they hold it
+    internally (`init_hidden=True`), and RSynaptic returns its output as part of the
+    state."""
+
+    package = "snntorch"
+    neurons = ("Synaptic", "RSynaptic", "Leaky", "RLeaky")
+
+    def is_stateful(self, module: nn.Module) -> bool:
+        if type(module).__name__ in self.neurons:
+            return not module.init_hidden
+        return super().is_stateful(module)
+
+    def state_is_output(self, module: nn.Module) -> bool:
+        return type(module).__name__ == "RSynaptic" and not module.init_hidden
+
+
+class NorseAdapter(_FrameworkAdapter):
+    """Norse modules take and return a single state object, as in
+    `output, state = module(input, state)`, which is stored as it is."""
+
+    package = "norse"
+
+    def call(self, module: nn.Module, input: Any, state: Optional[Any]) -> Any:
+        return module(input, state)
+
+    def split(self, module: nn.Module, output: Any) -> Tuple[Any, Any]:
+        return output[0], output[1]
+
+
+class SinabsAdapter(_FrameworkAdapter):
+    """Sinabs layers hold their state internally and only take the input."""
+
+    package = "sinabs"
+
+    def is_stateful(self, module: nn.Module) -> bool:
+        return False
+
+
+_adapters: List[ModuleAdapter] = [SinabsAdapter(), NorseAdapter(), SnnTorchAdapter()]
+_default_adapter = ModuleAdapter()
+
+
+def register_adapter(adapter: ModuleAdapter) -> None:
+    """Registers an adapter, which takes precedence over the adapters registered
+    before it.
+
+    >>> class MyAdapter(nirtorch.ModuleAdapter):
+    ...     def matches(self, module):
+    ...         return isinstance(module, MyNeuron)
+    ...     def is_stateful(self, module):
+    ...         return True
+    ...     def call(self, module, input, state):
+    ...         return module(input, state=state)
+    >>> nirtorch.register_adapter(MyAdapter())
+
+    Args:
+        adapter (ModuleAdapter): The adapter to register
+    """
+    _adapters.append(adapter)
+
+
+def get_adapter(module: nn.Module) -> ModuleAdapter:
+    """Returns the most recently registered adapter that matches the module, or the
+    default adapter for plain torch modules."""
+    for adapter in reversed(_adapters):
+        if adapter.matches(module):
+            return adapter
+    return _default_adapter
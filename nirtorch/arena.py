@@ -0,0 +1,209 @@
+import functools
+import heapq
+import math
+from typing import Any, List, Optional, Sequence, Tuple
+
+import torch
+from torch.utils import _pytree as pytree
+
+
+def assign_slots(intervals: Sequence[Optional[Tuple[int, int]]]) -> List[Optional[int]]:
+    """Assigns buffer slots to values with known lifetimes, reusing slots between
+    values whose lifetimes do not overlap.
+
+    This is a linear scan over the intervals, ordered by their start, which uses the
+    minimal number of slots for interval lifetimes.
+
+    Args:
+        intervals (Sequence[Optional[Tuple[int, int]]]): For every value, the first and
+            last index (inclusive) at which it is alive, or None if it needs no slot
+
+    Returns:
+        List[Optional[int]]: The slot of every value, or None if it needs no slot
+    """
+    slots = [None] * len(intervals)
+    order = sorted(
+        (i for i, interval in enumerate(intervals) if interval is not None),
+        key=lambda i: intervals[i][0],
+    )
+    # The active values as a heap of (end, index)
+    free_slots, active, num_slots = [], [], 0
+    for i in order:
+        start, end = intervals[i]
+        # Free the slots of the values that are dead before this one starts
+        while active and active[0][0] < start:
+            free_slots.append(slots[heapq.heappop(active)[1]])
+        if free_slots:
+            slots[i] = free_slots.pop()
+        else:
+            slots[i] = num_slots
+            num_slots += 1
+        heapq.heappush(active, (end, i))
+    return slots
+
+
+class FanInAccumulator:
+    """Sums the inputs of a node with several incoming edges.
+
+    The inputs are accumulated with a running, in-place sum into a single output
+    tensor, instead of stacking them into a new tensor and reducing it. The output can
+    be a preallocated buffer (see `ActivationArena.sum`), in which case the sum does
+    not allocate any memory.
+
+    The output dtype follows the promotion rules of `torch.sum`: the inputs are
+    promoted to a common dtype, and integer and boolean inputs (e.g. spikes) are summed
+    as `torch.int64`. A fixed dtype can be given instead, to which every input must be
+    safely castable.
+
+    Arguments:
+        dtype (Optional[torch.dtype]): The dtype of the sum. Defaults to None, which
+            promotes the dtypes of the inputs.
+    """
+
+    def __init__(self, dtype: Optional[torch.dtype] = None) -> None:
+        self.dtype = dtype
+
+    def result_dtype(self, tensors: Sequence[torch.Tensor]) -> torch.dtype:
+        """Returns the dtype of the sum of the tensors.
+
+        Raises:
+            TypeError: If an input cannot be safely cast to the fixed dtype
+        """
+        if self.dtype is not None:
+            for x in tensors:
+                if not torch.can_cast(x.dtype, self.dtype):
+                    raise TypeError(
+                        f"Cannot sum input of dtype {x.dtype} as {self.dtype}"
+                    )
+            return self.dtype
+        dtype = tensors[0].dtype
+        if any(x.dtype != dtype for x in tensors):
+            dtype = functools.reduce(torch.promote_types, (x.dtype for x in tensors))
+        if not (dtype.is_floating_point or dtype.is_complex):
+            dtype = torch.int64
+        return dtype
+
+    def __call__(
+        self, tensors: Sequence[torch.Tensor], out: Optional[torch.Tensor] = None
+    ) -> torch.Tensor:
+        """Sums two or more tensors, optionally into a given output tensor.
+
+        The output tensor must have the broadcast shape of the inputs and the dtype
+        given by `result_dtype`, and cannot be used if the inputs require gradients.
+        """
+        preallocated = out is not None
+        if preallocated:
+            # Accumulate in the dtype of the output, not in the dtype of the inputs
+            out.copy_(tensors[0])
+            out.add_(tensors[1])
+        else:
+            dtype = self.result_dtype(tensors)
+            first = tensors[0] if tensors[0].dtype == dtype else tensors[0].to(dtype)
+            out = torch.add(first, tensors[1])
+            if out.dtype != dtype:
+                out = out.to(dtype)
+        for x in tensors[2:]:
+            if preallocated or x.shape == out.shape:
+                out.add_(x)
+            else:
+                out = out + x  # May broadcast to a larger shape
+        return out
+
+
+class ActivationArena:
+    """A set of preallocated buffers (slots) for intermediate activations.
+
+    Every slot is a flat tensor that is allocated on first use and only reallocated if
+    a larger size, or a different dtype or device, is requested. In steady state,
+    requesting a buffer therefore does not allocate any memory.
+
+    Arguments:
+        num_slots (int): The number of slots
+    """
+
+    def __init__(self, num_slots: int) -> None:
+        self.buffers: List[Optional[torch.Tensor]] = [None] * num_slots
+        self._views: List[Optional[torch.Tensor]] = [None] * num_slots
+        self._data_ptrs = set()
+
+    def get(
+        self, slot: int, shape: torch.Size, dtype: torch.dtype, device: torch.device
+    ) -> torch.Tensor:
+        """Returns a view of the buffer of a slot with the given shape."""
+        view = self._views[slot]
+        if (
+            view is not None
+            and view.shape == shape
+            and view.dtype == dtype
+            and view.device == device
+        ):
+            return view
+        numel = math.prod(shape)
+        buffer = self.buffers[slot]
+        if (
+            buffer is None
+            or buffer.numel() < numel
+            or buffer.dtype != dtype
+            or buffer.device != device
+        ):
+            if buffer is not None:
+                self._data_ptrs.discard(buffer.untyped_storage().data_ptr())
+            buffer = torch.empty(numel, dtype=dtype, device=device)
+            self.buffers[slot] = buffer
+            self._data_ptrs.add(buffer.untyped_storage().data_ptr())
+        view = buffer[:numel].view(shape)
+        self._views[slot] = view
+        return view
+
+    def owns(self, tensor: torch.Tensor) -> bool:
+        """Checks whether a tensor is (a view of) one of the buffers."""
+        return tensor.untyped_storage().data_ptr() in self._data_ptrs
+
+    @staticmethod
+    def can_sum(tensors: Sequence[torch.Tensor]) -> bool:
+        """Checks whether tensors can be summed into a buffer, which requires tensors
+        on the same device, without an autograd graph. Grad mode must be disabled as
+        well, since the modules may save the sum for the backward pass, and the buffer
+        is overwritten in the next step."""
+        if torch.is_grad_enabled():
+            return False
+        first = tensors[0]
+        return all(
+            isinstance(x, torch.Tensor)
+            and x.device == first.device
+            and not x.requires_grad
+            for x in tensors
+        )
+
+    def sum(
+        self,
+        slot: int,
+        tensors: Sequence[torch.Tensor],
+        accumulator: Optional[FanInAccumulator] = None,
+    ) -> torch.Tensor:
+        """Sums two or more tensors into the buffer of a slot, without allocating.
+
+        Raises:
+            TypeError: If an input cannot be cast to the dtype of the accumulator
+        """
+        accumulator = accumulator or FanInAccumulator()
+        shape = tensors[0].shape
+        if any(x.shape != shape for x in tensors):
+            shape = torch.broadcast_shapes(*(x.shape for x in tensors))
+        dtype = accumulator.result_dtype(tensors)
+        out = self.get(slot, shape, dtype, tensors[0].device)
+        return accumulator(tensors, out=out)
+
+    def protect(self, value: Any) -> Any:
+        """Copies the tensors in a (nested) value that are stored in the arena, such
+        that the value stays valid when the buffers are reused."""
+        if isinstance(value, torch.Tensor):
+            return value.clone() if self.owns(value) else value
+        leaves, spec = pytree.tree_flatten(value)
+        if not any(isinstance(x, torch.Tensor) and self.owns(x) for x in leaves):
+            return value
+        leaves = [
+            x.clone() if isinstance(x, torch.Tensor) and self.owns(x) else x
+            for x in leaves
+        ]
+        return pytree.tree_unflatten(leaves, spec)
@@ -1,13 +1,32 @@
+import contextlib
 import dataclasses
-import inspect
-from typing import Any, Callable, Dict, List, Optional, Union
+import itertools
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
 
 import nir
 import torch
 import torch.nn as nn
+from torch.utils import _pytree as pytree
 
+from .adapters import get_adapter
+from .arena import ActivationArena, FanInAccumulator, assign_slots
 from .graph import Graph, Node
-from .graph_utils import trace_execution
+from .graph_utils import topological_sort
+from .profiling import Profiler
+from .tracing import Tracer, span
 from .utils import sanitize_name
 
 
@@ -15,12 +34,56 @@ from .utils import sanitize_name
 class GraphExecutorState:
     """State for the GraphExecutor that keeps track of both the state of hidden units
     and caches the output of previous modules, for use in (future) recurrent
-    computations."""
+    computations.
+
+    Only the outputs read by recurrent connections and the output of the graph are
+    cached; all other intermediate outputs are released as soon as they are used."""
 
     state: Dict[str, Any] = dataclasses.field(default_factory=dict)
     cache: Dict[str, Any] = dataclasses.field(default_factory=dict)
 
 
+class ExecutionStep(NamedTuple):
+    """A single, pre-resolved instruction in the execution plan of a GraphExecutor.
+
+    Attributes:
+        name (str): Name of the node, used as key in the state and cache
+        module (nn.Module): The module to apply
+        inputs (Tuple[str, ...]): Nodes computed earlier in the same step, whose
+            outputs are summed to form the input
+        recurrent_inputs (Tuple[str, ...]): Nodes computed later in the step, whose
+            outputs from the previous step are added to the input
+        stateful (bool): Whether the module accepts and returns a state
+        state_is_output (bool): Whether the complete output should be stored as state
+            (snnTorch RSynaptic)
+        takes_data (bool): Whether the data given to the executor is added to the
+            input
+        call (Optional[Callable]): The `ModuleAdapter.call` method of the adapter of
+            the module, or None if the module is stateless and called directly
+        split (Optional[Callable]): The `ModuleAdapter.split` method of the adapter
+            of the module, or None if the module does not store a state
+        release (Tuple[str, ...]): Outputs that are no longer needed after this step
+            and are dropped from the cache
+        arena_slot (Optional[int]): The slot in the activation arena that the inputs
+            are summed into, if there are several
+        protect (bool): Whether the output or state outlives the step, and hence may
+            not be stored in the activation arena
+    """
+
+    name: str
+    module: nn.Module
+    inputs: Tuple[str, ...]
+    recurrent_inputs: Tuple[str, ...]
+    stateful: bool
+    state_is_output: bool
+    takes_data: bool
+    call: Optional[Callable[[nn.Module, Any, Optional[Any]], Any]]
+    split: Optional[Callable[[nn.Module, Any], Tuple[Any, Any]]]
+    release: Tuple[str, ...] = ()
+    arena_slot: Optional[int] = None
+    protect: bool = False
+
+
 class GraphExecutor(nn.Module):
     """Executes the NIR graph in PyTorch.
 
@@ -33,44 +96,121 @@ class GraphExecutor(nn.Module):
         graph (Graph): The graph to execute
         return_state (bool, optional): Whether to return the state object.
             Defaults to True.
+        persistent_state (bool, optional): Whether to reuse two state objects that
+            swap roles every step, instead of creating a new state for every call.
+            The tensors of the module states are overwritten in place where possible.
+            A returned state is therefore only valid until two steps later, whereas
+            returned outputs stay valid.
+            Defaults to False.
+        activation_arena (bool, optional): Whether to sum the inputs of nodes with
+            several inputs into preallocated buffers (see `ActivationArena`), shared
+            between nodes whose outputs are not alive at the same time. This avoids
+            allocations when no gradients are required. Defaults to False.
+        fan_in_dtype (Optional[torch.dtype], optional): The dtype in which the inputs
+            of nodes with several inputs are summed (see `FanInAccumulator`).
+            Defaults to None, which promotes the dtypes of the inputs.
 
     Raises:
         ValueError: If there are no edges in the graph
     """
 
-    def __init__(self, graph: Graph, return_state: bool = True) -> None:
+    # Modules without hidden state that treat the first dimension as batch, such that
+    # they can be applied to several timesteps at once
+    time_invariant_modules: Tuple[Type[nn.Module], ...] = (
+        nn.Identity,
+        nn.Linear,
+        nn.Flatten,
+        nn.modules.conv._ConvNd,
+        nn.modules.pooling._AvgPoolNd,
+        nn.modules.pooling._MaxPoolNd,
+    )
+
+    def __init__(
+        self,
+        graph: Graph,
+        return_state: bool = True,
+        persistent_state: bool = False,
+        activation_arena: bool = False,
+        fan_in_dtype: Optional[torch.dtype] = None,
+    ) -> None:
         super().__init__()
         self.graph = graph
         self.stateful_modules = set()
         self.return_state = return_state
+        self.persistent_state = persistent_state
+        self.activation_arena = activation_arena
+        self.fan_in = FanInAccumulator(fan_in_dtype)
+        self.profiler: Optional[Profiler] = None
+        self._state_buffers = (GraphExecutorState(), GraphExecutorState())
         self.instantiate_modules()
-        self.execution_order = self.get_execution_order()
-        if len(self.execution_order) == 0:
+        self._build_graph_cache()
+        if len(self.plan) == 0:
             raise ValueError("Graph is empty")
 
+    def _build_graph_cache(self) -> None:
+        """Derive the execution order, the input nodes of every node and the execution
+        plan from the graph.
+
+        The result is cached and only re-evaluated if the graph changes, such that a
+        single (time)step does not need to search the graph for the sources of a node.
+        """
+        self.frozen_graph = self.graph.freeze()
+        self.components = self.get_components()
+        self.execution_order = [node for c in self.components for node in c]
+        self.input_nodes = self._find_input_nodes()
+        self.plan = self._assign_arena_slots(self._compile_plan())
+        self.time_batched_steps = self._find_time_batched_steps()
+        self.time_segments = self._segment_plan()
+        self._graph_version = (id(self.graph), self.graph.version)
+
     def _is_module_stateful(self, module: torch.nn.Module) -> bool:
-        signature = inspect.signature(module.forward)
-        arguments = len(signature.parameters)
-        # HACK for snntorch modules
-        if "snntorch" in str(module.__class__):
-            if module.__class__.__name__ in [
-                "Synaptic",
-                "RSynaptic",
-                "Leaky",
-                "RLeaky",
-            ]:
-                return not module.init_hidden
-        return "state" in signature.parameters and arguments > 1
+        return get_adapter(module).is_stateful(module)
 
-    def get_execution_order(self) -> List[Node]:
-        """Evaluate the execution order and instantiate that as a list."""
+    def get_components(self) -> List[List[Node]]:
+        """Find the strongly connected components reachable from the input.
+
+        Components with more than one node, or with a node connected to itself, are
+        recurrent loops that have to be executed step by step.
+
+        Returns:
+            List[List[Node]]: The components in topological order, where the nodes in
+                every component are in depth-first order from the input.
+        """
         # TODO: Adapt this for graphs with multiple inputs
-        inputs = self.graph.inputs
-        if len(inputs) != 1:
+        frozen = self.frozen_graph
+        if len(frozen.inputs) != 1:
             raise ValueError(
-                f"Currently, only one input is supported, but {len(inputs)} was given"
+                "Currently, only one input is supported, "
+                f"but {len(frozen.inputs)} was given"
             )
-        return trace_execution(inputs[0], lambda n: n.outgoing_nodes.keys())
+        components = frozen.strongly_connected_components(frozen.inputs)
+        # Order the components by the edges between them, such that the order is
+        # stable across branches
+        children = frozen.condensation(components)
+        order = topological_sort([0], children.__getitem__)
+        nodes = self.graph.node_list
+        return [[nodes[i] for i in components[c].tolist()] for c in order]
+
+    def _find_input_nodes(self) -> Dict[Node, List[Node]]:
+        """Find the sources of every node, in the order of
+        `Graph.find_source_nodes_of`."""
+        indptr, sources = self.frozen_graph.transpose()
+        indptr, sources = indptr.tolist(), sources.tolist()
+        nodes = self.graph.node_list
+        return {
+            node: [nodes[j] for j in sources[indptr[i] : indptr[i + 1]]]
+            for i, node in enumerate(nodes)
+        }
+
+    def get_execution_order(self) -> List[Node]:
+        """Evaluate the execution order and instantiate that as a list.
+
+        Nodes are executed after all of their inputs, except for inputs in the same
+        recurrent loop that come later in the order. Those are read from the previous
+        step.
+        """
+        self._update_graph_cache()
+        return list(self.execution_order)
 
     def instantiate_modules(self):
         for mod, name in self.graph.module_names.items():
@@ -83,85 +223,592 @@ class GraphExecutor(nn.Module):
         # NOTE: This is a hack. Should use the input nodes from NIR graph
         return self.graph.get_root()
 
-    def _apply_module(
+    def _compile_plan(self) -> List[ExecutionStep]:
+        """Compile the execution order into a flat list of execution steps.
+
+        Everything that can be known before execution is resolved here: which nodes to
+        skip, where the inputs of every node come from, whether a node is stateful,
+        how its output should be unpacked and when it can be released.
+        """
+        plan = []
+        computed = set()
+        # The bound hooks of every adapter, shared by all of its steps
+        hooks = {}
+        for node in self.execution_order:
+            if node.elem is None:
+                continue
+            inputs, recurrent_inputs = [], []
+            for input_node in self.input_nodes[node]:
+                if input_node.elem is None:
+                    continue
+                if input_node.name in computed:
+                    inputs.append(input_node.name)
+                else:
+                    # Not computed yet in this step, so we need the previous output
+                    recurrent_inputs.append(input_node.name)
+            adapter = get_adapter(node.elem)
+            if id(adapter) not in hooks:
+                hooks[id(adapter)] = (adapter.call, adapter.split)
+            call, split = hooks[id(adapter)]
+            stateful = node.name in self.stateful_modules
+            state_is_output = adapter.state_is_output(node.elem)
+            plan.append(
+                ExecutionStep(
+                    name=node.name,
+                    module=node.elem,
+                    inputs=tuple(inputs),
+                    recurrent_inputs=tuple(recurrent_inputs),
+                    stateful=stateful,
+                    state_is_output=state_is_output,
+                    takes_data=len(plan) == 0,
+                    call=call if stateful else None,
+                    split=split if stateful or state_is_output else None,
+                )
+            )
+            computed.add(node.name)
+        return self._release_dead_outputs(plan)
+
+    def _release_dead_outputs(self, plan: List[ExecutionStep]) -> List[ExecutionStep]:
+        """Find the step after which every output is no longer needed (liveness).
+
+        Outputs read by recurrent connections in the next step, and the output of the
+        graph, are kept in the cache (see `persistent_outputs`). All other outputs are
+        released after their last consumer.
+        """
+        self.persistent_outputs = {
+            name for step in plan for name in step.recurrent_inputs
+        }
+        if plan:
+            self.persistent_outputs.add(plan[-1].name)
+        last_use = {}
+        for i, step in enumerate(plan):
+            last_use.setdefault(step.name, i)
+            for name in step.inputs:
+                last_use[name] = i
+        release = [[] for _ in plan]
+        for name, i in last_use.items():
+            if name not in self.persistent_outputs:
+                release[i].append(name)
+        return [step._replace(release=tuple(r)) for step, r in zip(plan, release)]
+
+    def _assign_arena_slots(self, plan: List[ExecutionStep]) -> List[ExecutionStep]:
+        """Assign slots in the activation arena to the steps with several inputs.
+
+        The summed inputs may be returned as output by the module (e.g. by an identity
+        or a view), so a slot stays alive until the last consumer of the output. The
+        same holds for every step with a single forward input, which is passed to its
+        module as is if its recurrent inputs are missing (in the first step), so the
+        slot also stays alive until the last consumer of the outputs of such steps
+        downstream. Outputs and states that outlive the step are copied out
+        of the arena, see `ActivationArena.protect`.
+        """
+        last_use = {}
+        for i, step in enumerate(plan):
+            last_use[step.name] = i
+            for name in step.inputs:
+                last_use[name] = i
+        # In reverse, such that the last use of every output is final when it is
+        # propagated to the input it may alias
+        for step in reversed(plan):
+            if len(step.inputs) == 1:
+                source = step.inputs[0]
+                last_use[source] = max(last_use[source], last_use[step.name])
+        intervals = [
+            (i, last_use[step.name])
+            if len(step.inputs) + len(step.recurrent_inputs) + step.takes_data > 1
+            else None
+            for i, step in enumerate(plan)
+        ]
+        slots = assign_slots(intervals)
+        num_slots = max((slot for slot in slots if slot is not None), default=-1) + 1
+        self.arena = ActivationArena(num_slots)
+        return [
+            step._replace(
+                arena_slot=slot,
+                protect=step.stateful
+                or step.state_is_output
+                or step.name in self.persistent_outputs,
+            )
+            for step, slot in zip(plan, slots)
+        ]
+
+    def _apply_step(
         self,
-        node: Node,
-        input_nodes: List[Node],
+        step: ExecutionStep,
         new_state: GraphExecutorState,
         old_state: GraphExecutorState,
-        data: Optional[torch.Tensor] = None,
+        data: torch.Tensor,
     ):
-        """Applies a module and keeps track of its state.
+        """Applies the module of a step and keeps track of its state.
 
         TODO: Use pytree to recursively construct the state
         """
-        inputs = []
-        # Append state if needed
-        if node.name in self.stateful_modules and node.name in old_state.state:
-            inputs.extend(old_state.state[node.name])
-
         # Sum recurrence if needed
-        summed_inputs = [] if data is None else [data]
-        for input_node in input_nodes:
-            if (
-                input_node.name not in new_state.cache
-                and input_node.name in old_state.cache
-            ):
-                summed_inputs.append(old_state.cache[input_node.name])
-            elif input_node.name in new_state.cache:
-                summed_inputs.append(new_state.cache[input_node.name])
+        summed_inputs = [data] if step.takes_data else []
+        for name in step.inputs:
+            summed_inputs.append(new_state.cache[name])
+        for name in step.recurrent_inputs:
+            if name in old_state.cache:
+                summed_inputs.append(old_state.cache[name])
 
         if len(summed_inputs) == 0:
-            raise ValueError("No inputs found for node {}".format(node.name))
+            raise ValueError("No inputs found for node {}".format(step.name))
         elif len(summed_inputs) == 1:
-            inputs.insert(0, summed_inputs[0])
-        elif len(summed_inputs) > 1:
-            inputs.insert(0, torch.stack(summed_inputs).sum(0))
-
-        out = node.elem(*inputs)
-        # If the module is stateful, we know the output is (at least) a tuple
-        # HACK to make it work for snnTorch
-        is_rsynaptic = "snntorch._neurons.rsynaptic.RSynaptic" in str(
-            node.elem.__class__
+            summed = summed_inputs[0]
+        elif (
+            self.activation_arena
+            and step.arena_slot is not None
+            and self.arena.can_sum(summed_inputs)
+        ):
+            summed = self.arena.sum(step.arena_slot, summed_inputs, self.fan_in)
+        else:
+            summed = self.fan_in(summed_inputs)
+
+        if step.call is None:
+            out = step.module(summed)
+        else:
+            out = step.call(step.module, summed, old_state.state.get(step.name))
+        # The adapter separates the state to store from the output
+        if step.split is not None:
+            out, new_state.state[step.name] = step.split(step.module, out)
+        return out
+
+    def _update_graph_cache(self) -> None:
+        if self._graph_version != (id(self.graph), self.graph.version):
+            self._build_graph_cache()
+
+    def _step(
+        self,
+        plan: List[ExecutionStep],
+        data: torch.Tensor,
+        new_state: GraphExecutorState,
+        old_state: GraphExecutorState,
+    ) -> None:
+        """Executes the plan for a single (time)step, writing into `new_state`."""
+        # NOTE: This logic is not yet consistent for models with multiple input nodes
+        if self.profiler is not None or self.activation_arena:
+            return self._step_instrumented(plan, data, new_state, old_state)
+        cache = new_state.cache
+        for step in plan:
+            cache[step.name] = self._apply_step(step, new_state, old_state, data)
+            for name in step.release:
+                del cache[name]
+
+    def _step_instrumented(
+        self,
+        plan: List[ExecutionStep],
+        data: torch.Tensor,
+        new_state: GraphExecutorState,
+        old_state: GraphExecutorState,
+    ) -> None:
+        """Executes the plan for a single (time)step like `_step`, but measures the
+        steps with the profiler and copies outputs and states that outlive the step out
+        of the activation arena, if enabled."""
+        profiler = self.profiler
+        if profiler is not None:
+            start = profiler.time()
+            apply = self._apply_step_profiled
+        else:
+            apply = self._apply_step
+        cache = new_state.cache
+        for step in plan:
+            out = apply(step, new_state, old_state, data)
+            if self.activation_arena and step.protect:
+                out = self.arena.protect(out)
+                if step.name in new_state.state:
+                    state = self.arena.protect(new_state.state[step.name])
+                    new_state.state[step.name] = state
+            cache[step.name] = out
+            for name in step.release:
+                del cache[name]
+        if profiler is not None:
+            profiler.record_step(start, profiler.time())
+
+    def _apply_step_profiled(
+        self,
+        step: ExecutionStep,
+        new_state: GraphExecutorState,
+        old_state: GraphExecutorState,
+        data: torch.Tensor,
+    ):
+        """Applies the module of a step like `_apply_step` and records it with the
+        profiler."""
+        inputs = [data] if step.takes_data else []
+        inputs += [new_state.cache[name] for name in step.inputs]
+        inputs += [
+            old_state.cache[name]
+            for name in step.recurrent_inputs
+            if name in old_state.cache
+        ]
+        start = self.profiler.time()
+        out = self._apply_step(step, new_state, old_state, data)
+        end = self.profiler.time()
+        self.profiler.record_node(
+            step.name, start, end, inputs, out, new_state.state.get(step.name)
         )
-        if is_rsynaptic and not node.elem.init_hidden:
-            assert "lif" in node.name, "this shouldnt happen.."
-            new_state.state[node.name] = out  # snnTorch requires output inside state
-            out = out[0]
-        elif node.name in self.stateful_modules:
-            new_state.state[node.name] = out[1:]  # Store the new state
-            out = out[0]
-        return out, new_state
+        return out
+
+    @contextlib.contextmanager
+    def profile(
+        self, synchronize: bool = False, tracer: Optional[Tracer] = None
+    ) -> Iterator[Profiler]:
+        """Measures the nodes and (time)steps executed within the context.
+
+        >>> with executor.profile() as profiler:
+        ...     output, state = executor(data)
+        >>> print(profiler.report())
+
+        Profiling can also be enabled permanently by setting `executor.profiler`.
+        Without a profiler, the execution is not instrumented at all.
+
+        Args:
+            synchronize (bool): Whether to synchronize CUDA before every measurement.
+                Defaults to False.
+            tracer (Optional[Tracer]): A tracer to add every (time)step and node call
+                to, see `nirtorch.tracing`. Defaults to None.
+
+        Returns:
+            Iterator[Profiler]: The profiler with the measurements
+        """
+        previous = self.profiler
+        self.profiler = Profiler(synchronize, tracer)
+        try:
+            yield self.profiler
+        finally:
+            self.profiler = previous
 
     def forward(
         self, data: torch.Tensor, old_state: Optional[GraphExecutorState] = None
     ):
         if old_state is None:
             old_state = GraphExecutorState()
-        new_state = GraphExecutorState()
-        first_node = True
-        # NOTE: This logic is not yet consistent for models with multiple input nodes
-        for node in self.execution_order:
-            input_nodes = self.graph.find_source_nodes_of(node)
-            if node.elem is None:
-                continue
-            out, new_state = self._apply_module(
-                node,
-                input_nodes,
-                new_state=new_state,
-                old_state=old_state,
-                data=data if first_node else None,
-            )
-            new_state.cache[node.name] = out
-            first_node = False
+        self._update_graph_cache()
+        if self.persistent_state:
+            # Swap the buffers, reusing the one that is not the old state
+            new_state = self._state_buffers[old_state is self._state_buffers[0]]
+            previous_state, new_state.state = new_state.state, {}
+            new_state.cache.clear()
+            self._step(self.plan, data, new_state, old_state)
+            _write_state_in_place(previous_state, new_state)
+            _protect_outputs(new_state.cache, (new_state.state, old_state.state))
+        else:
+            new_state = GraphExecutorState()
+            self._step(self.plan, data, new_state, old_state)
+        # The last step is the output (skipping dummy nir.Output nodes)
+        out = new_state.cache[self.plan[-1].name]
+        if self.return_state:
+            return out, new_state
+        else:
+            return out
+
+    def forward_sequence(
+        self,
+        data: torch.Tensor,
+        old_state: Optional[GraphExecutorState] = None,
+        batch_time: bool = False,
+    ):
+        """Executes the graph for every (time)step in a sequence of inputs.
+
+        This is equivalent to calling the executor in a loop over the first dimension
+        of the data and stacking the outputs, but avoids allocating new state objects
+        for every step: two state objects are reused, alternating between holding
+        the previous and the current step.
+
+        If `batch_time` is set, the time-invariant modules outside of recurrent loops
+        (see `time_batched_steps`) are applied once to all timesteps, by flattening the
+        time and batch dimensions. The plan is executed segment by segment
+        (see `time_segments`), and only the segments with stateful modules or
+        recurrent loops are executed step by step.
+
+        Arguments:
+            data (torch.Tensor): Input data of shape [T, ...], where T is the number of
+                timesteps
+            old_state (Optional[GraphExecutorState]): The state to start from. It is
+                not modified. Defaults to None.
+            batch_time (bool): Whether to apply the time-invariant modules outside of
+                recurrent loops to all timesteps at once. This requires the data to
+                have shape [T, B, ...] and the modules to treat the first dimension as
+                batch. Defaults to False.
+
+        Returns:
+            The outputs of shape [T, ...] and, if `return_state` is set, the state after
+            the last step.
+        """
+        if len(data) == 0:
+            raise ValueError("Cannot execute an empty sequence")
+        self._update_graph_cache()
+        if old_state is None:
+            old_state = GraphExecutorState()
 
-        # If the output node is a dummy nir.Output node, use the second-to-last node
-        if node.name not in new_state.cache:
-            node = self.execution_order[-2]
+        output_name = self.plan[-1].name
+        if batch_time:
+            segments = self.time_segments
+        else:
+            segments = [_Segment(False, self.plan, (), (output_name,))]
+        # Outputs of all timesteps, for the nodes that are read by later segments
+        sequences = {}
+        final_state = GraphExecutorState()
+        for segment in segments:
+            if segment.batched:
+                self._apply_batched_segment(
+                    segment, data, old_state, sequences, final_state
+                )
+            else:
+                state = self._step_segment(segment, data, old_state, sequences)
+                final_state.state.update(state.state)
+                for name, out in state.cache.items():
+                    if name in self.persistent_outputs:
+                        final_state.cache[name] = out
+
+        outputs = sequences[output_name]
         if self.return_state:
-            return new_state.cache[node.name], new_state
+            return outputs, final_state
         else:
-            return new_state.cache[node.name]
+            return outputs
+
+    def _apply_batched_segment(
+        self,
+        segment: "_Segment",
+        data: torch.Tensor,
+        old_state: GraphExecutorState,
+        sequences: Dict[str, torch.Tensor],
+        final_state: GraphExecutorState,
+    ) -> None:
+        """Applies the steps of a segment to all timesteps at once, by flattening the
+        time and batch dimensions."""
+        time_shape = data.shape[:2]
+        batched_state = GraphExecutorState()
+        for name in segment.external_inputs:
+            batched_state.cache[name] = sequences[name].flatten(0, 1)
+        flat_data = data.flatten(0, 1)
+        apply = self._apply_step if self.profiler is None else self._apply_step_profiled
+        for step in segment.steps:
+            out = apply(step, batched_state, old_state, flat_data)
+            batched_state.cache[step.name] = out
+            out = out.unflatten(0, time_shape)
+            if step.name in self.persistent_outputs:
+                final_state.cache[step.name] = out[-1]
+            if step.name in segment.kept_outputs:
+                sequences[step.name] = out
+            for name in step.release:
+                del batched_state.cache[name]
+
+    def _step_segment(
+        self,
+        segment: "_Segment",
+        data: torch.Tensor,
+        old_state: GraphExecutorState,
+        sequences: Dict[str, torch.Tensor],
+    ) -> GraphExecutorState:
+        """Executes the steps of a segment step by step and returns the last state.
+
+        Two state objects are reused, alternating between holding the previous and the
+        current step. With `persistent_state`, the module states are also overwritten
+        in place.
+        """
+        states = (GraphExecutorState(), GraphExecutorState())
+        for t, data_t in enumerate(data):
+            # Alternate between the two state objects, recycling the oldest one
+            new_state = states[t % 2]
+            previous_state = new_state.state
+            new_state.state = {}
+            new_state.cache.clear()
+            for name in segment.external_inputs:
+                new_state.cache[name] = sequences[name][t]
+            self._step(segment.steps, data_t, new_state, old_state)
+            if self.persistent_state:
+                _write_state_in_place(previous_state, new_state)
+            for name in segment.kept_outputs:
+                out = new_state.cache[name]
+                if t == 0:
+                    sequences[name] = out.new_empty((len(data), *out.shape))
+                sequences[name][t] = out
+            old_state = new_state
+        return new_state
+
+    def to_torchscript(
+        self, sample_data: torch.Tensor, freeze: bool = True
+    ) -> torch.jit.ScriptModule:
+        """Compiles the graph to TorchScript, to run without the Python interpreter.
+
+        The graph is first compiled to a `torch.fx.GraphModule`, which takes the state
+        as explicit tensors (see `nirtorch.to_fx.FxGraphExecutor`), and then traced.
+
+        >>> module = executor.to_torchscript(input)
+        >>> output, *state = module(input, *initial_state)
+
+        Args:
+            sample_data (torch.Tensor): Input data for a single (time)step
+            freeze (bool): Whether to freeze the module, inlining the weights as
+                constants. Defaults to True.
+
+        Returns:
+            torch.jit.ScriptModule: The compiled module
+        """
+        from .to_fx import graph_executor_to_fx
+
+        return graph_executor_to_fx(self, sample_data).to_torchscript(
+            sample_data, freeze=freeze
+        )
+
+    def export(
+        self, sample_data: torch.Tensor, dynamic_batch: bool = False
+    ) -> torch.export.ExportedProgram:
+        """Exports the graph with `torch.export`, for ahead-of-time compilation.
+
+        The graph is first compiled to a `torch.fx.GraphModule`, which takes and
+        returns the state as explicit tensors (see `nirtorch.to_fx.FxGraphExecutor`).
+
+        Args:
+            sample_data (torch.Tensor): Input data for a single (time)step
+            dynamic_batch (bool): Whether the batch dimension is dynamic.
+                Defaults to False.
+
+        Returns:
+            torch.export.ExportedProgram: The exported program
+        """
+        from .to_fx import graph_executor_to_fx
+
+        return graph_executor_to_fx(self, sample_data).export(
+            sample_data, dynamic_batch=dynamic_batch
+        )
+
+    def _find_time_batched_steps(self) -> Set[str]:
+        """Find the steps that can be applied to all timesteps at once.
+
+        These are the steps with time-invariant modules (see `time_invariant_modules`)
+        that are neither stateful nor part of a recurrent loop. Since the execution
+        order is topological, their inputs can be fully computed before them.
+        """
+        self_loops = self.frozen_graph.self_loops()
+        positions = self.graph._node_positions
+        recurrent = {
+            node.name
+            for component in self.components
+            if len(component) > 1 or self_loops[positions[id(component[0].elem)]]
+            for node in component
+        }
+        return {
+            step.name
+            for step in self.plan
+            if isinstance(step.module, self.time_invariant_modules)
+            and not step.stateful
+            and not step.state_is_output
+            and step.name not in recurrent
+        }
+
+    def _segment_plan(self) -> List["_Segment"]:
+        """Split the plan into consecutive segments of time-batched and stepped
+        steps."""
+        groups = [
+            (batched, list(steps))
+            for batched, steps in itertools.groupby(
+                self.plan, key=lambda step: step.name in self.time_batched_steps
+            )
+        ]
+        # The last group that reads the output of every step
+        last_group = {
+            name: i
+            for i, (_, steps) in enumerate(groups)
+            for step in steps
+            for name in step.inputs
+        }
+        segments = []
+        for i, (batched, steps) in enumerate(groups):
+            names = {step.name for step in steps}
+            external_inputs = {
+                name: None
+                for step in steps
+                for name in step.inputs + step.recurrent_inputs
+                if name not in names
+            }
+            kept_outputs = tuple(
+                step.name
+                for step in steps
+                if last_group.get(step.name, i) > i or step is self.plan[-1]
+            )
+            if batched:
+                # The outputs of batched steps are kept for all timesteps
+                steps = [step._replace(arena_slot=None) for step in steps]
+            segments.append(
+                _Segment(batched, steps, tuple(external_inputs), kept_outputs)
+            )
+        return segments
+
+
+def _copy_state(buffer: Any, value: Any) -> Any:
+    """Copies a module state into the tensors of an older state of the same structure.
+
+    The tensors of the first state are cloned, such that the buffers are owned by the
+    executor and can be overwritten without affecting the outputs of the modules.
+    States that are part of an autograd graph are returned as they are.
+    """
+    leaves, spec = pytree.tree_flatten(value)
+    if any(isinstance(leaf, torch.Tensor) and leaf.requires_grad for leaf in leaves):
+        return value
+    if buffer is not None:
+        buffer_leaves, buffer_spec = pytree.tree_flatten(buffer)
+        if spec == buffer_spec and all(
+            isinstance(buffer_leaf, torch.Tensor)
+            and buffer_leaf.shape == leaf.shape
+            and buffer_leaf.dtype == leaf.dtype
+            and buffer_leaf.device == leaf.device
+            for buffer_leaf, leaf in zip(buffer_leaves, leaves)
+            if isinstance(leaf, torch.Tensor)
+        ):
+            for i, leaf in enumerate(leaves):
+                if isinstance(leaf, torch.Tensor):
+                    buffer_leaves[i].copy_(leaf)
+                    leaves[i] = buffer_leaves[i]
+            if all(x is y for x, y in zip(leaves, buffer_leaves)):
+                return buffer
+            return pytree.tree_unflatten(leaves, spec)
+    # Take ownership of a copy, to overwrite in later steps
+    leaves = [x.clone() if isinstance(x, torch.Tensor) else x for x in leaves]
+    return pytree.tree_unflatten(leaves, spec)
+
+
+def _write_state_in_place(
+    previous_state: Dict[str, Any], new_state: GraphExecutorState
+) -> None:
+    """Moves the module states of a step into the tensors of an older step."""
+    for name, value in new_state.state.items():
+        new_state.state[name] = _copy_state(previous_state.get(name), value)
+
+
+def _protect_outputs(cache: Dict[str, Any], states: Sequence[Dict[str, Any]]) -> None:
+    """Copies the outputs that share memory with the tensors of a module state, e.g.
+    of a delay that returns its incoming state. The state tensors are overwritten in
+    later steps, which must not affect the outputs that were returned."""
+    storages = {
+        leaf.untyped_storage().data_ptr()
+        for state in states
+        for leaf in pytree.tree_leaves(state)
+        if isinstance(leaf, torch.Tensor)
+    }
+    for name, out in cache.items():
+        if (
+            isinstance(out, torch.Tensor)
+            and out.untyped_storage().data_ptr() in storages
+        ):
+            cache[name] = out.clone()
+
+
+class _Segment(NamedTuple):
+    """Consecutive steps of the plan that are either all time-batched or all stepped.
+
+    Attributes:
+        batched (bool): Whether the steps are applied to all timesteps at once
+        steps (List[ExecutionStep]): The steps in the segment
+        external_inputs (Tuple[str, ...]): Outputs of earlier segments read by the steps
+        kept_outputs (Tuple[str, ...]): Outputs read by later segments, or the output
+            of the graph, for which the values of all timesteps are kept
+    """
+
+    batched: bool
+    steps: List[ExecutionStep]
+    external_inputs: Tuple[str, ...]
+    kept_outputs: Tuple[str, ...]
 
 
 def _mod_nir_to_graph(
@@ -202,6 +849,8 @@ def load(
     nir_graph: Union[nir.NIRNode, str],
     model_map: Callable[[nir.NIRNode], nn.Module],
     return_state: bool = True,
+    as_fx: bool = False,
+    sample_data: Optional[torch.Tensor] = None,
 ) -> nn.Module:
     """Load a NIR graph and convert it to a torch module using the given model map.
 
@@ -214,8 +863,22 @@ def load(
     >>> output, state = executor(input, old_state) # Notice second argument and output
     >>> output, state = executor(input, state) # This can go on for many (time)steps
 
+    Sequences of shape [T, ...] can also be executed in one call, which avoids the
+    overhead of allocating new state objects for every (time)step
+
+    >>> outputs, state = executor.forward_sequence(inputs)
+
     If you do not wish to operate with state, set `return_state=False`.
 
+    With `as_fx=True`, the graph is instead compiled to a `torch.fx.GraphModule`
+    (see `nirtorch.to_fx.FxGraphExecutor`), which takes and returns the state as
+    explicit tensors
+
+    >>> module = nirtorch.load(nir_graph, model_map, as_fx=True, sample_data=input)
+    >>> output, *state = module(input, *module.initial_state())
+
+    That module can be exported with `torch.export.export(module, (input, *state))`.
+
     Args:
         nir_graph (Union[nir.NIRNode, str]): The NIR object to load, or a string
             representing the path to the NIR object.
@@ -225,15 +888,31 @@ def load(
             tuple of [output, state], where state is a GraphExecutorState object.
             If False, only the NIR graph output will be returned. Note that state is
             required for recurrence to work in the graphs.
+        as_fx (bool): If True, generate a `torch.fx.GraphModule` instead of
+            interpreting the graph with a GraphExecutor. Defaults to False.
+        sample_data (Optional[torch.Tensor]): Input data for a single (time)step, used
+            to determine the structure of the state. Required if `as_fx` is True.
 
     Returns:
         nn.Module: The generated torch module
     """
+    if as_fx and sample_data is None:
+        raise ValueError("Generating a torch.fx.GraphModule requires sample_data")
     if isinstance(nir_graph, str):
-        nir_graph = nir.read(nir_graph)
+        with span("read", "load", path=nir_graph):
+            nir_graph = nir.read(nir_graph)
     # Map modules to the target modules using th emodel map
-    nir_module_graph = _switch_models_with_map(nir_graph, model_map)
+    with span("model_map", "load"):
+        nir_module_graph = _switch_models_with_map(nir_graph, model_map)
     # Build a nirtorch.Graph based on the nir_graph
-    graph = _mod_nir_to_graph(nir_module_graph, nir_nodes=nir_graph.nodes)
+    with span("graph", "load"):
+        graph = _mod_nir_to_graph(nir_module_graph, nir_nodes=nir_graph.nodes)
     # Build and return a graph executor module
-    return GraphExecutor(graph, return_state=return_state)
+    with span("plan", "load"):
+        executor = GraphExecutor(graph, return_state=return_state)
+    if as_fx:
+        from .to_fx import graph_executor_to_fx
+
+        with span("fx", "load"):
+            return graph_executor_to_fx(executor, sample_data)
+    return executor
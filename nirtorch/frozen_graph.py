@@ -0,0 +1,453 @@
+"""An immutable, array-backed form of `Graph` for passes over large graphs.
+
+Nodes are numbered 0..N-1 in the order of `Graph.node_list`. The edges are stored as
+compressed sparse rows: the destinations of node `i` are
+`indices[indptr[i]:indptr[i + 1]]`, in the order the edges were added. The shapes of
+the edges are stored out of line, as a table of distinct shapes that `shape_ids`
+(aligned with `indices`) refers to.
+
+>>> frozen = graph.freeze()
+>>> frozen = frozen.ignore_tensors().leaf_only()
+>>> components = frozen.strongly_connected_components()
+>>> graph = frozen.thaw()
+"""
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple, Type
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from .graph import Graph
+
+
+class FrozenGraph:
+    """A read-only graph of integer node ids in compressed sparse row format.
+
+    Every pass returns a new `FrozenGraph`. Use `Graph.freeze` to create one and
+    `thaw` to convert it back into a mutable `Graph`.
+
+    Attributes:
+        elems (List[Any]): The element (module or tensor) of every node
+        names (List[str]): The name of every node
+        indptr (np.ndarray): The offsets of the outgoing edges of every node in
+            `indices`, of length N + 1
+        indices (np.ndarray): The destination of every edge, grouped by source
+        shape_ids (np.ndarray): The index of the shape of every edge in `shapes`
+        shapes (List[Any]): The distinct shapes of the edges
+        inputs (np.ndarray): The ids of the input nodes
+        module_names (Dict[nn.Module, str]): The named modules of the graph
+        module_output_types (Dict[nn.Module, torch.Tensor]): The output shapes of
+            the modules
+    """
+
+    def __init__(
+        self,
+        elems: List[Any],
+        names: List[str],
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        shape_ids: np.ndarray,
+        shapes: List[Any],
+        inputs: np.ndarray,
+        module_names: Dict[nn.Module, str],
+        module_output_types: Dict[nn.Module, torch.Tensor],
+    ) -> None:
+        self.elems = elems
+        self.names = names
+        self.indptr = _read_only(indptr)
+        self.indices = _read_only(indices)
+        self.shape_ids = _read_only(shape_ids)
+        self.shapes = shapes
+        self.inputs = _read_only(inputs)
+        self.module_names = module_names
+        self.module_output_types = module_output_types
+        # Whether the element of every node is a key of `module_names`
+        module_ids = {id(mod) for mod in module_names}
+        self.named = _read_only(
+            np.fromiter(
+                (id(elem) in module_ids for elem in elems),
+                dtype=bool,
+                count=len(elems),
+            )
+        )
+        self._transpose: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    @classmethod
+    def from_graph(cls, graph: Graph) -> "FrozenGraph":
+        """Converts a mutable graph. Prefer `Graph.freeze`."""
+        nodes = graph.node_list
+        positions = graph._node_positions
+        counts = np.fromiter(
+            (len(node.outgoing_nodes) for node in nodes),
+            dtype=np.int64,
+            count=len(nodes),
+        )
+        indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        indices = np.fromiter(
+            (
+                positions[id(destination.elem)]
+                for node in nodes
+                for destination in node.outgoing_nodes
+            ),
+            dtype=np.int64,
+            count=indptr[-1],
+        )
+        shapes = _ShapeTable()
+        shape_ids = np.fromiter(
+            (
+                shapes.add(shape)
+                for node in nodes
+                for shape in node.outgoing_nodes.values()
+            ),
+            dtype=np.int64,
+            count=indptr[-1],
+        )
+        inputs = [positions.get(id(node.elem)) for node in graph.inputs]
+        return cls(
+            elems=[node.elem for node in nodes],
+            names=[node.name for node in nodes],
+            indptr=indptr,
+            indices=indices,
+            shape_ids=shape_ids,
+            shapes=shapes.shapes,
+            inputs=np.array([i for i in inputs if i is not None], dtype=np.int64),
+            module_names=graph.module_names,
+            module_output_types=graph.module_output_types,
+        )
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.elems)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.indices)
+
+    def edges(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the sources and destinations of all edges, in edge order."""
+        sources = np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+        return sources, self.indices
+
+    def successors(self, node: int) -> np.ndarray:
+        return self.indices[self.indptr[node] : self.indptr[node + 1]]
+
+    def predecessors(self, node: int) -> np.ndarray:
+        """The sources of a node in ascending order, like
+        `Graph.find_source_nodes_of`."""
+        indptr, indices = self.transpose()
+        return indices[indptr[node] : indptr[node + 1]]
+
+    def transpose(self) -> Tuple[np.ndarray, np.ndarray]:
+        """The incoming edges in compressed sparse row format (indptr, sources)."""
+        if self._transpose is None:
+            sources, destinations = self.edges()
+            # A stable sort keeps the sources of every node in ascending order
+            order = np.argsort(destinations, kind="stable")
+            indptr = np.zeros(self.num_nodes + 1, dtype=np.int64)
+            np.cumsum(
+                np.bincount(destinations, minlength=self.num_nodes), out=indptr[1:]
+            )
+            self._transpose = (_read_only(indptr), _read_only(sources[order]))
+        return self._transpose
+
+    def in_degree(self) -> np.ndarray:
+        return np.bincount(self.indices, minlength=self.num_nodes)
+
+    def out_degree(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def self_loops(self) -> np.ndarray:
+        """Returns whether every node has an edge to itself."""
+        sources, destinations = self.edges()
+        loops = np.zeros(self.num_nodes, dtype=bool)
+        loops[sources[sources == destinations]] = True
+        return loops
+
+    def node_ids(self, elems: Sequence[Any]) -> np.ndarray:
+        """Returns the ids of the nodes of the given elements.
+
+        Raises:
+            ValueError: If an element is not in the graph
+        """
+        positions = {id(elem): i for i, elem in enumerate(self.elems)}
+        try:
+            return np.array([positions[id(elem)] for elem in elems], dtype=np.int64)
+        except KeyError:
+            raise ValueError("elem not found")
+
+    def ignore_tensors(self) -> "FrozenGraph":
+        """Removes all the tensors, see `ignore_nodes`."""
+        return self.ignore_nodes(torch.Tensor)
+
+    def ignore_nodes(self, class_type: Type) -> "FrozenGraph":
+        """Removes the nodes of the given type, like `Graph.ignore_nodes`.
+
+        Every source of a removed node is connected to every destination of it, with
+        the shape of the outgoing edge. Like `Graph.ignore_nodes`, this assumes that
+        removed nodes are not connected to each other.
+        """
+        removed = np.fromiter(
+            (isinstance(elem, class_type) for elem in self.elems),
+            dtype=bool,
+            count=self.num_nodes,
+        )
+        sources, destinations = self.edges()
+        edge_ids = np.arange(self.num_edges)
+        kept = ~removed[sources] & ~removed[destinations]
+        # Join the edges into (a) and out of (b) every removed node on that node
+        into = edge_ids[~removed[sources] & removed[destinations]]
+        out_of = edge_ids[removed[sources] & ~removed[destinations]]
+        into = into[np.argsort(destinations[into], kind="stable")]
+        out_of = out_of[np.argsort(sources[out_of], kind="stable")]
+        count_into = np.bincount(destinations[into], minlength=self.num_nodes)
+        count_out_of = np.bincount(sources[out_of], minlength=self.num_nodes)
+        start_into = np.cumsum(count_into) - count_into
+        start_out_of = np.cumsum(count_out_of) - count_out_of
+        # Every destination with every source, in the order of `Graph.ignore_nodes`
+        pairs = count_into * count_out_of
+        node = np.repeat(np.arange(self.num_nodes), pairs)
+        offset = np.arange(pairs.sum()) - np.repeat(np.cumsum(pairs) - pairs, pairs)
+        edge_into = into[start_into[node] + offset % count_into[node]]
+        edge_out_of = out_of[start_out_of[node] + offset // count_into[node]]
+
+        # The edges of every source are ordered by the node that emits them, which is
+        # the source itself or the removed node in between
+        new_sources = np.concatenate([sources[kept], sources[edge_into]])
+        new_destinations = np.concatenate(
+            [destinations[kept], destinations[edge_out_of]]
+        )
+        emitters = np.concatenate([sources[kept], node])
+        sequence = np.arange(len(new_sources))
+        shape_ids = np.concatenate([self.shape_ids[kept], self.shape_ids[edge_out_of]])
+        order = np.lexsort((sequence, emitters, new_sources))
+        module_names = {
+            mod: name
+            for mod, name in self.module_names.items()
+            if not isinstance(mod, class_type)
+        }
+        return self._rebuild(
+            self.named & ~removed,
+            new_sources[order],
+            new_destinations[order],
+            shape_ids[order],
+            module_names,
+        )
+
+    def leaf_only(self) -> "FrozenGraph":
+        """Removes the modules with a child module in the graph, like
+        `Graph.leaf_only`."""
+        elem_ids = {id(elem) for elem in self.elems}
+        leaf = np.fromiter(
+            (
+                not isinstance(elem, nn.Module)
+                or not any(id(child) in elem_ids for child in elem.children())
+                for elem in self.elems
+            ),
+            dtype=bool,
+            count=self.num_nodes,
+        )
+        sources, destinations = self.edges()
+        kept = leaf[sources] & leaf[destinations]
+        module_names = {
+            elem: self.module_names[elem]
+            for elem, named, is_leaf in zip(self.elems, self.named, leaf)
+            if named and is_leaf
+        }
+        return self._rebuild(
+            self.named & leaf,
+            sources[kept],
+            destinations[kept],
+            self.shape_ids[kept],
+            module_names,
+        )
+
+    def strongly_connected_components(
+        self, roots: Optional[Sequence[int]] = None
+    ) -> List[np.ndarray]:
+        """Finds the strongly connected components reachable from the given nodes.
+
+        Tarjan's algorithm is inherently sequential, so it runs on plain integer
+        lists derived from the arrays, indexed by node id instead of hashed.
+
+        Args:
+            roots (Optional[Sequence[int]]): The nodes to start the search from.
+                Defaults to all nodes.
+
+        Returns:
+            List[np.ndarray]: The node ids of every component, in topological order,
+                such that edges between components only point to components later in
+                the list. The nodes of every component are listed in the order they
+                were discovered (depth-first).
+        """
+        indptr = self.indptr.tolist()
+        indices = self.indices.tolist()
+        roots = range(self.num_nodes) if roots is None else np.asarray(roots).tolist()
+        index = [-1] * self.num_nodes
+        lowlink = [0] * self.num_nodes
+        on_stack = [False] * self.num_nodes
+        stack_position = [0] * self.num_nodes
+        stack = []
+        # The discovered nodes of every component, and the offsets of the components
+        order = []
+        offsets = []
+        for root in roots:
+            if index[root] >= 0:
+                continue
+            work = [[root, indptr[root]]]
+            index[root] = lowlink[root] = len(order) + len(stack)
+            stack_position[root] = len(stack)
+            stack.append(root)
+            on_stack[root] = True
+            while work:
+                frame = work[-1]
+                node, edge = frame
+                end = indptr[node + 1]
+                while edge < end:
+                    child = indices[edge]
+                    edge += 1
+                    if index[child] < 0:
+                        frame[1] = edge
+                        index[child] = lowlink[child] = len(order) + len(stack)
+                        stack_position[child] = len(stack)
+                        stack.append(child)
+                        on_stack[child] = True
+                        work.append([child, indptr[child]])
+                        break
+                    elif on_stack[child] and index[child] < lowlink[node]:
+                        lowlink[node] = index[child]
+                else:
+                    # All children are visited
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        if lowlink[node] < lowlink[parent]:
+                            lowlink[parent] = lowlink[node]
+                    if lowlink[node] == index[node]:
+                        # The stack is in discovery order
+                        start = stack_position[node]
+                        for member in stack[start:]:
+                            on_stack[member] = False
+                        offsets.append(len(order))
+                        order.extend(stack[start:])
+                        del stack[start:]
+        # Tarjan's algorithm finds the components in reverse topological order
+        components = np.split(np.array(order, dtype=np.int64), offsets[1:])
+        components.reverse()
+        return components
+
+    def condensation(self, components: List[np.ndarray]) -> List[List[int]]:
+        """Lists the components that every component has edges to.
+
+        Args:
+            components (List[np.ndarray]): Components, as returned by
+                `strongly_connected_components`
+
+        Returns:
+            List[List[int]]: The indices of the child components of every component,
+                in the order the nodes of the component and their edges are listed
+        """
+        order = np.concatenate(components) if components else np.zeros(0, np.int64)
+        component = np.full(self.num_nodes, -1, dtype=np.int64)
+        component[order] = np.repeat(
+            np.arange(len(components)), [len(c) for c in components]
+        )
+        rank = np.full(self.num_nodes, self.num_nodes, dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        sources, destinations = self.edges()
+        between = (
+            (component[sources] >= 0)
+            & (component[destinations] >= 0)
+            & (component[sources] != component[destinations])
+        )
+        edge_ids = np.flatnonzero(between)
+        edge_ids = edge_ids[np.argsort(rank[sources[edge_ids]], kind="stable")]
+        pairs = np.stack(
+            [component[sources[edge_ids]], component[destinations[edge_ids]]], axis=1
+        )
+        _, first = np.unique(pairs, axis=0, return_index=True)
+        children = [[] for _ in components]
+        for parent, child in pairs[np.sort(first)].tolist():
+            children[parent].append(child)
+        return children
+
+    def thaw(self) -> Graph:
+        """Converts the graph back into a mutable `Graph`, with the same node order."""
+        graph = Graph({}, inputs=[], module_output_types=self.module_output_types)
+        graph.module_names = self.module_names
+        nodes = [
+            graph.add_elem(elem, name) for elem, name in zip(self.elems, self.names)
+        ]
+        graph.inputs = [nodes[i] for i in self.inputs.tolist()]
+        indptr = self.indptr.tolist()
+        indices = self.indices.tolist()
+        shape_ids = self.shape_ids.tolist()
+        for i, node in enumerate(nodes):
+            for j in range(indptr[i], indptr[i + 1]):
+                node.add_outgoing(nodes[indices[j]], self.shapes[shape_ids[j]])
+        graph.version += 1
+        return graph
+
+    def _rebuild(
+        self,
+        keep: np.ndarray,
+        sources: np.ndarray,
+        destinations: np.ndarray,
+        shape_ids: np.ndarray,
+        module_names: Dict[nn.Module, str],
+    ) -> "FrozenGraph":
+        """Creates a graph from edges sorted by source, dropping duplicate edges.
+
+        Besides the nodes in `keep`, the nodes connected to any edge are kept, since
+        `Graph.add_edge` adds them.
+        """
+        keys = sources * self.num_nodes + destinations
+        _, first = np.unique(keys, return_index=True)
+        first.sort()
+        sources, destinations = sources[first], destinations[first]
+        shape_ids = shape_ids[first]
+        keep = keep.copy()
+        keep[sources] = True
+        keep[destinations] = True
+        new_ids = np.cumsum(keep) - 1
+        kept_nodes = np.flatnonzero(keep).tolist()
+        indptr = np.zeros(len(kept_nodes) + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(new_ids[sources], minlength=len(kept_nodes)), out=indptr[1:]
+        )
+        return FrozenGraph(
+            elems=[self.elems[i] for i in kept_nodes],
+            names=[self.names[i] for i in kept_nodes],
+            indptr=indptr,
+            indices=new_ids[destinations],
+            shape_ids=shape_ids,
+            shapes=self.shapes,
+            inputs=new_ids[self.inputs[keep[self.inputs]]],
+            module_names=module_names,
+            module_output_types=self.module_output_types,
+        )
+
+
+class _ShapeTable:
+    """Collects the distinct shapes of the edges."""
+
+    def __init__(self) -> None:
+        self.shapes: List[Any] = []
+        self._ids: Dict[Hashable, int] = {}
+
+    def add(self, shape: Any) -> int:
+        try:
+            index = self._ids.get(shape)
+        except TypeError:
+            # Unhashable shapes are not shared
+            self.shapes.append(shape)
+            return len(self.shapes) - 1
+        if index is None:
+            index = self._ids[shape] = len(self.shapes)
+            self.shapes.append(shape)
+        return index
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    array.flags.writeable = False
+    return array
@@ -1,6 +1,7 @@
 import warnings
+import weakref
 from numbers import Number
-from typing import Any, Callable, Dict, List, Optional, Type, Union
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union
 
 import torch
 import torch.nn as nn
@@ -44,12 +45,16 @@ class Node:
     ) -> None:
         self.elem = elem
         self.name = sanitize_name(name)
-        if not outgoing_nodes:
-            self.outgoing_nodes = {}
-        else:
-            self.outgoing_nodes = outgoing_nodes
+        # The nodes with an edge to this node, maintained by `add_outgoing`. The shape
+        # of every edge is stored in `outgoing_nodes` of the source
+        self.incoming_nodes: List["Node"] = []
+        self.outgoing_nodes = {}
+        for node, shape in (outgoing_nodes or {}).items():
+            self.add_outgoing(node, shape)
 
     def add_outgoing(self, node: "Node", shape=None) -> None:
+        if node not in self.outgoing_nodes:
+            node.incoming_nodes.append(self)
         self.outgoing_nodes[node] = shape
 
     def __str__(self) -> str:
@@ -76,8 +81,17 @@ class Graph:
     ) -> None:
         self.module_names = module_names
         self.node_list: List[Node] = []
+        # The position of every node in `node_list` by the identity of its element,
+        # maintained by `add_elem`
+        self._node_positions: Dict[int, int] = {}
+        # The nodes by their name, built on demand, see `node_map_by_id`
+        self._nodes_by_name: Optional[Dict[str, Node]] = None
+        self._nodes_by_name_version = None
         self.module_output_types = module_output_types
         self._last_used_tensor_id = None
+        # Incremented on every structural change, so that consumers can cache
+        # derived data (e.g. execution orders) and invalidate it when needed
+        self.version = 0
         self.inputs = []
         # Add modules to node_list
         for mod, name in self.module_names.items():
@@ -86,8 +100,14 @@ class Graph:
                 self.inputs.append(node)
 
     @property
-    def node_map_by_id(self):
-        return {n.name: n for n in self.node_list}
+    def node_map_by_id(self) -> Dict[str, Node]:
+        """The nodes by their name. If several nodes have the same name, the last
+        added one is returned. Do not modify the returned dictionary, which is cached
+        until the graph changes."""
+        if self._nodes_by_name_version != self.version:
+            self._nodes_by_name = {node.name: node for node in self.node_list}
+            self._nodes_by_name_version = self.version
+        return self._nodes_by_name
 
     def num_edges(self) -> int:
         count = 0
@@ -103,23 +123,29 @@ class Graph:
         return str(self._last_used_tensor_id)
 
     def __contains__(self, elem: Union[torch.Tensor, nn.Module]) -> bool:
-        for node in self.node_list:
-            if elem is node.elem:
-                return True
-        return False
+        # Nodes hold a reference to their element, so its id cannot be reused
+        return id(elem) in self._node_positions
+
+    def _get_node(self, elem: Any) -> Optional[Node]:
+        position = self._node_positions.get(id(elem))
+        return None if position is None else self.node_list[position]
 
     def add_elem(self, elem, name: str) -> Node:
-        if elem in self:
+        node = self._get_node(elem)
+        if node is not None:
             warnings.warn(f"{name}: Node already exists for this element ")
-            return self.find_node(elem)
+            return node
         else:
             node = Node(elem, name)
+            self._node_positions[id(elem)] = len(self.node_list)
             self.node_list.append(node)
+            self.version += 1
             return node
 
     def add_or_get_node_for_elem(self, elem: Union[torch.Tensor, nn.Module]):
-        if elem in self:
-            return self.find_node(elem)
+        node = self._get_node(elem)
+        if node is not None:
+            return node
         else:
             # Generate a name
             if elem in self.module_names:
@@ -135,10 +161,10 @@ class Graph:
             return new_node
 
     def find_node(self, elem: Union[torch.Tensor, nn.Module]):
-        for node in self.node_list:
-            if elem is node.elem:
-                return node
-        raise ValueError("elem not found")
+        node = self._get_node(elem)
+        if node is None:
+            raise ValueError("elem not found")
+        return node
 
     def add_edge(
         self,
@@ -157,22 +183,16 @@ class Graph:
         source_node = self.add_or_get_node_for_elem(source)
         destination_node = self.add_or_get_node_for_elem(destination)
         source_node.add_outgoing(destination_node, shape)
+        self.version += 1
         return source_node, destination_node
 
     def get_leaf_modules(self) -> Dict[nn.Module, str]:
-        filtered_module_names = {}
-
-        for mod, _ in self.module_names.items():
-            # Add module to dict
-            filtered_module_names[mod] = self.module_names[mod]
-            child_in_graph = False
-            for _, submod in mod.named_children():
-                if submod in self:
-                    child_in_graph = True
-                    break
-            if child_in_graph:
-                del filtered_module_names[mod]
-        return filtered_module_names
+        """The modules without a child module in the graph."""
+        return {
+            mod: name
+            for mod, name in self.module_names.items()
+            if not any(id(child) in self._node_positions for child in mod.children())
+        }
 
     def _is_mod_and_not_in_module_names(self, elem: Any) -> bool:
         """Check if a node is a module and is included in the module_names of this
@@ -227,25 +247,20 @@ class Graph:
         return filtered_graph
 
     def ignore_submodules_of(self, classes: List[Type]) -> "Graph":
-        new_named_modules = {}
-
-        # Gather a list of all top level modules, whose submodules are to be ignored
-        top_level_modules: List[nn.Module] = []
-        for mod in self.module_names.keys():
-            if mod.__class__ in classes:
-                top_level_modules.append(mod)
-
-        # List all the submodules of the above module list
-        sub_modules_to_ignore: List[nn.Module] = []
-        for top_mod in top_level_modules:
-            for sub_mod in top_mod.modules():
-                if sub_mod is not top_mod:
-                    sub_modules_to_ignore.append(sub_mod)
-
-        # Iterate over all modules and check if they are submodules of the above list
-        for mod, name in self.module_names.items():
-            if mod not in sub_modules_to_ignore:
-                new_named_modules[mod] = name
+        classes = set(classes)
+        # The identities of all submodules of the modules of the given classes. Nested
+        # modules of these classes are already covered by their top level module.
+        ignored = set()
+        for mod in self.module_names:
+            if mod.__class__ in classes and id(mod) not in ignored:
+                ignored.update(
+                    id(sub_mod) for sub_mod in mod.modules() if sub_mod is not mod
+                )
+        new_named_modules = {
+            mod: name
+            for mod, name in self.module_names.items()
+            if id(mod) not in ignored
+        }
         # Create a new graph with the allowed modules
         new_graph = Graph(
             new_named_modules,
@@ -262,14 +277,18 @@ class Graph:
             node (Node): Node of interest
 
         Returns:
-            List[Node]: A list of all nodes that have this node as outgoing_node
+            List[Node]: A list of all nodes that have this node as outgoing_node, in
+                the order of `node_list`
         """
-        source_node_list = []
-        for source_node in self.node_list:
-            for outnode, _ in source_node.outgoing_nodes.items():
-                if node == outnode:
-                    source_node_list.append(source_node)
-        return source_node_list
+        # The node may be from another graph with the same element
+        node = self._get_node(node.elem)
+        if node is None:
+            return []
+        positions = self._node_positions
+        return sorted(
+            (source for source in node.incoming_nodes if id(source.elem) in positions),
+            key=lambda source: positions[id(source.elem)],
+        )
 
     def ignore_tensors(self) -> "Graph":
         """Simplify the graph by ignoring all the tensors in it.
@@ -316,6 +335,17 @@ class Graph:
                         graph.add_edge(node.elem, outnode.elem, shape)
         return graph
 
+    def freeze(self) -> "FrozenGraph":  # noqa: F821
+        """Converts the graph into an immutable, array-backed form.
+
+        Returns:
+            FrozenGraph: The graph with integer node ids in the order of `node_list`,
+                see `nirtorch.frozen_graph.FrozenGraph`
+        """
+        from .frozen_graph import FrozenGraph
+
+        return FrozenGraph.from_graph(self)
+
     def get_root(self) -> List[Node]:
         """Returns the root node/s of the graph.
 
@@ -365,6 +395,94 @@ def module_forward_wrapper(
     return my_forward
 
 
+class TensorProvenance:
+    """Records the modules that produced and consumed every live tensor, without
+    keeping the tensors alive.
+
+    The records are keyed by the id of the tensor and removed by a finalizer when
+    the tensor is garbage collected, so that a reused id never refers to a stale
+    record.
+    """
+
+    def __init__(self) -> None:
+        # Producers, consumers (with the consumed shape) and finalizer of every tensor
+        self._records: Dict[int, Tuple[list, list, weakref.finalize]] = {}
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _record(self, tensor: torch.Tensor) -> Tuple[list, list, weakref.finalize]:
+        record = self._records.get(id(tensor))
+        if record is None:
+            finalizer = weakref.finalize(tensor, self._records.pop, id(tensor), None)
+            finalizer.atexit = False
+            record = self._records[id(tensor)] = ([], [], finalizer)
+        return record
+
+    def consume(self, tensor: torch.Tensor, module: nn.Module) -> List[nn.Module]:
+        """Records a module reading the tensor.
+
+        Returns:
+            List[nn.Module]: The modules that produced the tensor so far
+        """
+        producers, consumers, _ = self._record(tensor)
+        consumers.append((module, tensor.shape))
+        return list(producers)
+
+    def produce(
+        self, tensor: torch.Tensor, module: nn.Module
+    ) -> List[Tuple[nn.Module, torch.Size]]:
+        """Records a module returning the tensor. A tensor can have several producers,
+        e.g. a module and the container that returns its output.
+
+        Returns:
+            List[Tuple[nn.Module, torch.Size]]: The modules that read the tensor so
+                far, with the shape they read
+        """
+        producers, consumers, _ = self._record(tensor)
+        producers.append(module)
+        return list(consumers)
+
+    def clear(self) -> None:
+        for _, _, finalizer in self._records.values():
+            finalizer.detach()
+        self._records.clear()
+
+
+def module_edges_forward_wrapper(
+    model_graph: Graph,
+    output_types: Dict[nn.Module, torch.Tensor],
+    provenance: TensorProvenance,
+) -> Callable[..., Any]:
+    """Like `module_forward_wrapper`, but connects the modules directly instead of
+    adding nodes for the tensors between them.
+
+    Every producer of a tensor is connected to every consumer of it, which gives the
+    same edges as `module_forward_wrapper` followed by `Graph.ignore_tensors`.
+    """
+
+    def my_forward(mod: nn.Module, *args, **kwargs) -> Any:
+        out = _torch_module_call(mod, *args, **kwargs)
+
+        if isinstance(out, tuple):
+            output_data = out[0]
+        elif isinstance(out, torch.Tensor):
+            output_data = out
+        else:
+            raise Exception("Unknown output format")
+        output_types[mod] = output_data.shape
+
+        for input_data in args:
+            if isinstance(input_data, torch.Tensor):
+                for producer in provenance.consume(input_data, mod):
+                    model_graph.add_edge(producer, mod, input_data.shape)
+        for consumer, shape in provenance.produce(output_data, mod):
+            model_graph.add_edge(mod, consumer, shape)
+        return out
+
+    return my_forward
+
+
 class GraphTracer:
     """Context manager to trace a model's execution graph.
 
@@ -378,19 +496,27 @@ class GraphTracer:
     ```
     """
 
-    def __init__(self, mod: nn.Module) -> None:
+    def __init__(self, mod: nn.Module, modules_only: bool = False) -> None:
         self.original_torch_call = nn.Module.__call__
         self.output_types = {}
         self.graph = Graph(mod, self.output_types)
+        self.modules_only = modules_only
+        self.provenance = TensorProvenance()
 
     def __enter__(self) -> "GraphTracer":
         # Override the torch call method
-        nn.Module.__call__ = module_forward_wrapper(self.graph, self.output_types)
+        if self.modules_only:
+            nn.Module.__call__ = module_edges_forward_wrapper(
+                self.graph, self.output_types, self.provenance
+            )
+        else:
+            nn.Module.__call__ = module_forward_wrapper(self.graph, self.output_types)
         return self
 
     def __exit__(self, exc_type, exc_value, exc_tb):
         # Restore normal behavior
         nn.Module.__call__ = self.original_torch_call
+        self.provenance.clear()
 
 
 def extract_torch_graph(
@@ -398,6 +524,7 @@ def extract_torch_graph(
     sample_data: Any,
     model_name: Optional[str] = "model",
     model_args=[],
+    modules_only: bool = False,
 ) -> Graph:
     """Extract computational graph between various modules in the model
     NOTE: This method is not capable of any compute happening outside of module
@@ -414,11 +541,15 @@ def extract_torch_graph(
                 n_names = {x.name for x in n.outgoing_nodes}
                 if node.name in n_names:
                     shape = n.outgoing_nodes[node]
+        modules_only (bool): If True, connect the modules directly, as
+          `Graph.ignore_tensors` would, instead of adding a node for every
+          intermediate tensor. The tensors are not kept alive by the tracer, which
+          reduces the peak memory for large models. Defaults to False.
     Returns:
         Graph: A graph object representing the computational graph of the given model
     """
     with GraphTracer(
-        named_modules_map(model, model_name=model_name)
+        named_modules_map(model, model_name=model_name), modules_only=modules_only
     ) as tracer, torch.no_grad():
         _ = model(sample_data, *model_args)
 
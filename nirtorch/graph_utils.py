@@ -1,4 +1,4 @@
-from typing import Callable, List, Set, TypeVar
+from typing import Callable, Iterable, List, Set, TypeVar
 
 T = TypeVar("T")
 
@@ -16,8 +16,12 @@ def find_parents(node, edges):
 def find_all_ancestors(
     node, edges, roots=None, parents_found=None, nodes_inspected=None
 ):
-    """Given a node and the edges of a graph, find all ancesters of that node."""
-    roots = roots  # or find_roots(edges)
+    """Given a node and the edges of a graph, find all ancesters of that node.
+
+    The search does not continue past the nodes in `roots`. It is iterative and visits
+    every edge once, so it neither hits the recursion limit nor scales quadratically.
+    """
+    roots = set(roots or [])  # or find_roots(edges)
     if node in roots:
         return set()
 
@@ -25,16 +29,18 @@ def find_all_ancestors(
     nodes_inspected = nodes_inspected or set()
     if node in nodes_inspected:
         return set()
-    # Direct parents
-    parents_found.update(find_parents(node, edges))
+    parents = {}
+    for parent, child in edges:
+        parents.setdefault(child, []).append(parent)
     nodes_inspected.add(node)
-    # Find grandparents
-    for parent in parents_found.difference(nodes_inspected):
-        # Account for nodes that have been added after start of the loop
-        if parent not in nodes_inspected:
-            parents_found.update(
-                find_all_ancestors(parent, edges, roots, parents_found, nodes_inspected)
-            )
+    to_inspect = [node]
+    while to_inspect:
+        for parent in parents.get(to_inspect.pop(), []):
+            parents_found.add(parent)
+            # Find grandparents
+            if parent not in nodes_inspected and parent not in roots:
+                nodes_inspected.add(parent)
+                to_inspect.append(parent)
     return parents_found
 
 
@@ -70,17 +76,72 @@ def trace_execution(
     node: T, edge_fn: Callable[[T], List[T]], visited: Set[T] = None
 ) -> List[T]:
     """Traces the execution of a node by listing them in order, coloring recursive nodes
-    to avoid adding the same node twice."""
+    to avoid adding the same node twice.
+
+    The nodes are listed in depth-first pre-order. The traversal is iterative and
+    linear in the number of nodes and edges, so deep graphs do not hit the recursion
+    limit.
+    """
     if visited is None:
         visited = set()
 
     if node in visited:
         return []
-    else:
-        visited.add(node)
-
-    successors = []
-    for child in edge_fn(node):
-        if child not in visited:
-            successors += trace_execution(child, edge_fn, visited)
-    return [node] + successors
+    visited.add(node)
+    order = [node]
+    work = [iter(edge_fn(node))]
+    while work:
+        for child in work[-1]:
+            if child not in visited:
+                visited.add(child)
+                order.append(child)
+                work.append(iter(edge_fn(child)))
+                break
+        else:
+            work.pop()
+    return order
+
+
+def topological_sort(
+    nodes: Iterable[T], edge_fn: Callable[[T], Iterable[T]]
+) -> List[T]:
+    """Sorts the nodes of an acyclic graph such that every node comes after its parents.
+
+    This is Kahn's algorithm, which is iterative and linear in the number of nodes and
+    edges. The result is stable: ties are broken by the order of the given nodes and
+    then by the order of the edges, so the same graph always gives the same order.
+
+    Args:
+        nodes (Iterable[T]): The nodes to sort. Nodes reachable from them are included
+        edge_fn (Callable[[T], Iterable[T]]): Returns the children of a node
+
+    Raises:
+        ValueError: If the graph contains a cycle
+
+    Returns:
+        List[T]: The nodes in topological order
+    """
+    nodes = trace_all(nodes, edge_fn)
+    in_degree = {node: 0 for node in nodes}
+    for node in nodes:
+        for child in edge_fn(node):
+            in_degree[child] += 1
+    order = [node for node in nodes if in_degree[node] == 0]
+    # The order list doubles as the queue of nodes without remaining parents
+    for node in order:
+        for child in edge_fn(node):
+            in_degree[child] -= 1
+            if in_degree[child] == 0:
+                order.append(child)
+    if len(order) != len(nodes):
+        raise ValueError("Cannot sort a graph with cycles topologically")
+    return order
+
+
+def trace_all(nodes: Iterable[T], edge_fn: Callable[[T], Iterable[T]]) -> List[T]:
+    """Lists all nodes reachable from the given nodes, in depth-first pre-order."""
+    visited = set()
+    order = []
+    for node in nodes:
+        order.extend(trace_execution(node, edge_fn, visited))
+    return order
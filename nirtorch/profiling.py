@@ -0,0 +1,172 @@
+import dataclasses
+import time
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import torch
+from torch.utils import _pytree as pytree
+
+from .tracing import Tracer
+
+Shapes = Tuple[Tuple[int, ...], ...]
+
+
+@dataclasses.dataclass
+class NodeProfile:
+    """The measurements of a single node, aggregated over all calls.
+
+    Attributes:
+        name (str): The name of the node
+        calls (int): The number of calls
+        total_time (float): The total wall time of the calls in seconds, including
+            the summation of the inputs and the handling of the state
+        output_bytes (int): The total size in bytes of the outputs and states returned
+            by the calls. Memory allocated and freed within the module, such as
+            intermediate activations, is not measured.
+        input_shapes (Set[Shapes]): The distinct shapes of the inputs, per call
+        output_shapes (Set[Shapes]): The distinct shapes of the outputs, per call
+    """
+
+    name: str
+    calls: int = 0
+    total_time: float = 0.0
+    output_bytes: int = 0
+    input_shapes: Set[Shapes] = dataclasses.field(default_factory=set)
+    output_shapes: Set[Shapes] = dataclasses.field(default_factory=set)
+
+    @property
+    def mean_time(self) -> float:
+        return self.total_time / self.calls if self.calls else 0.0
+
+
+def _shapes(values: Sequence[Any]) -> Shapes:
+    leaves = pytree.tree_leaves(values)
+    return tuple(tuple(x.shape) for x in leaves if isinstance(x, torch.Tensor))
+
+
+def _nbytes(value: Any) -> int:
+    return sum(
+        x.numel() * x.element_size()
+        for x in pytree.tree_leaves(value)
+        if isinstance(x, torch.Tensor)
+    )
+
+
+class Profiler:
+    """Records the wall time, calls, shapes and output bytes of every node executed
+    by a `GraphExecutor`, and the wall time and output bytes of every (time)step.
+
+    >>> with executor.profile() as profiler:
+    ...     outputs, state = executor.forward_sequence(data)
+    >>> print(profiler.report())
+
+    Nodes in time-batched segments (see `GraphExecutor.forward_sequence`) are called
+    once for all timesteps.
+
+    Arguments:
+        synchronize (bool): Whether to wait for CUDA kernels to finish before taking a
+            measurement. Without it, asynchronous kernels are attributed to the node
+            that waits for them. Defaults to False.
+        tracer (Optional[Tracer]): A tracer to which every (time)step and node call is
+            added as an event, to inspect individual calls on a timeline.
+            Defaults to None.
+    """
+
+    def __init__(
+        self, synchronize: bool = False, tracer: Optional[Tracer] = None
+    ) -> None:
+        self.synchronize = synchronize and torch.cuda.is_available()
+        self.tracer = tracer
+        self.nodes: Dict[str, NodeProfile] = {}
+        self.step_times: List[float] = []
+        # The output bytes of every step, summed over its nodes
+        self.step_output_bytes: List[int] = []
+        self._current_step_bytes = 0
+
+    def time(self) -> float:
+        """Returns the current time in seconds, after synchronizing if enabled."""
+        if self.synchronize:
+            torch.cuda.synchronize()
+        return time.perf_counter()
+
+    def record_node(
+        self,
+        name: str,
+        start: float,
+        end: float,
+        inputs: Sequence[Any],
+        output: Any,
+        state: Optional[Any] = None,
+    ) -> None:
+        """Adds a call of a node to the measurements, with start and end in seconds
+        from `time`."""
+        profile = self.nodes.get(name)
+        if profile is None:
+            profile = self.nodes[name] = NodeProfile(name)
+        input_shapes = _shapes(inputs)
+        profile.calls += 1
+        profile.total_time += end - start
+        output_bytes = _nbytes(output) + _nbytes(state)
+        profile.output_bytes += output_bytes
+        self._current_step_bytes += output_bytes
+        profile.input_shapes.add(input_shapes)
+        profile.output_shapes.add(_shapes([output]))
+        if self.tracer is not None:
+            args = {"inputs": str(list(input_shapes))}
+            self.tracer.add_event(name, "node", start, end, args)
+
+    def record_step(self, start: float, end: float) -> None:
+        """Adds a (time)step to the measurements, with the output bytes of the nodes
+        recorded since the previous step."""
+        self.step_times.append(end - start)
+        self.step_output_bytes.append(self._current_step_bytes)
+        self._current_step_bytes = 0
+        if self.tracer is not None:
+            self.tracer.add_event("step", "executor", start, end)
+
+    def reset(self) -> None:
+        self.nodes.clear()
+        self.step_times.clear()
+        self.step_output_bytes.clear()
+        self._current_step_bytes = 0
+
+    def summary(self, sort_by: str = "total_time") -> List[NodeProfile]:
+        """Returns the measurements of the nodes, in descending order.
+
+        Args:
+            sort_by (str): The attribute of `NodeProfile` to sort by.
+                Defaults to "total_time".
+        """
+        return sorted(
+            self.nodes.values(), key=lambda p: getattr(p, sort_by), reverse=True
+        )
+
+    def report(self, sort_by: str = "total_time") -> str:
+        """Formats the measurements as a table, sorted as in `summary`."""
+        total = sum(p.total_time for p in self.nodes.values()) or 1.0
+        rows = [
+            (
+                p.name,
+                str(p.calls),
+                f"{p.total_time * 1e3:.3f}",
+                f"{p.mean_time * 1e6:.1f}",
+                f"{p.total_time / total * 100:.1f}",
+                str(p.output_bytes),
+                " | ".join(str(list(s)) for s in sorted(p.input_shapes)),
+                " | ".join(str(list(s)) for s in sorted(p.output_shapes)),
+            )
+            for p in self.summary(sort_by)
+        ]
+        header = ("node", "calls", "total ms", "mean us", "%", "out bytes", "in", "out")
+        widths = [max(len(row[i]) for row in [header, *rows]) for i in range(8)]
+        lines = [
+            "  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip()
+            for row in [header, *rows]
+        ]
+        if self.step_times:
+            num_steps = len(self.step_times)
+            lines.append(
+                f"{num_steps} steps, "
+                f"{sum(self.step_times) / num_steps * 1e6:.1f} us/step, "
+                f"{sum(self.step_output_bytes) / num_steps:.0f} output bytes/step"
+            )
+        return "\n".join(lines)
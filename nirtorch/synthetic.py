@@ -0,0 +1,165 @@
+"""Reproducible synthetic NIR graphs of arbitrary size, for scale and stress tests.
+
+>>> graph = synthetic_graph(10000, fan_in=3, recurrence=0.01)
+>>> executor = nirtorch.load(graph, default_model_map)
+"""
+from typing import Optional
+
+import nir
+import numpy as np
+import torch
+import torch.nn as nn
+
+from .from_nir import GraphExecutor, load
+
+
+class SyntheticLIF(nn.Module):
+    """A minimal leaky integrate-and-fire neuron for `nir.LIF` nodes."""
+
+    def __init__(self, tau: np.ndarray, v_threshold: np.ndarray) -> None:
+        super().__init__()
+        self.register_buffer("tau", torch.as_tensor(tau).float())
+        self.register_buffer("v_threshold", torch.as_tensor(v_threshold).float())
+
+    def forward(self, x: torch.Tensor, state: Optional[torch.Tensor] = None):
+        if state is None:
+            state = torch.zeros_like(x)
+        v = state + (x - state) / self.tau
+        z = (v > self.v_threshold).to(x.dtype)
+        return z, v * (1 - z)
+
+
+class SyntheticSubgraph(nn.Module):
+    """Executes a nested `nir.NIRGraph` node, carrying its state between steps."""
+
+    def __init__(self, executor: GraphExecutor) -> None:
+        super().__init__()
+        self.executor = executor
+
+    def forward(self, x: torch.Tensor, state=None):
+        return self.executor(x, state)
+
+
+def default_model_map(node: nir.NIRNode) -> nn.Module:
+    """Maps the nodes of `synthetic_graph` to torch modules.
+
+    Raises:
+        NotImplementedError: If the node type is not generated by `synthetic_graph`
+    """
+    if isinstance(node, nir.Affine):
+        lin = nn.Linear(*node.weight.shape[-2:][::-1])
+        lin.weight.data = torch.as_tensor(node.weight).float()
+        lin.bias.data = torch.as_tensor(node.bias).float()
+        return lin
+    elif isinstance(node, nir.LIF):
+        return SyntheticLIF(node.tau, node.v_threshold)
+    elif isinstance(node, (nir.Input, nir.Output)):
+        return nn.Identity()
+    elif isinstance(node, nir.NIRGraph):
+        return SyntheticSubgraph(load(node, default_model_map))
+    raise NotImplementedError(f"Unsupported node {node}")
+
+
+def _affine(rng: np.random.Generator, width: int) -> nir.Affine:
+    # Scaled such that the activity neither dies out nor explodes along long chains
+    weight = rng.normal(scale=1 / np.sqrt(width), size=(width, width))
+    return nir.Affine(weight.astype(np.float32), np.zeros(width, dtype=np.float32))
+
+
+def _lif(width: int) -> nir.LIF:
+    return nir.LIF(
+        tau=np.full(width, 2.0),
+        r=np.ones(width),
+        v_leak=np.zeros(width),
+        v_threshold=np.full(width, 0.5),
+    )
+
+
+def _subgraph(rng: np.random.Generator, width: int) -> nir.NIRGraph:
+    """A recurrently connected LIF population, like the hidden layer of braille.nir."""
+    return nir.NIRGraph(
+        nodes={
+            "input": nir.Input(np.array([width])),
+            "lif": _lif(width),
+            "w_rec": _affine(rng, width),
+            "output": nir.Output(np.array([width])),
+        },
+        edges=[
+            ("input", "lif"),
+            ("lif", "w_rec"),
+            ("w_rec", "lif"),
+            ("lif", "output"),
+        ],
+    )
+
+
+def synthetic_graph(
+    num_nodes: int,
+    width: int = 4,
+    fan_in: int = 1,
+    locality: Optional[int] = None,
+    recurrence: float = 0.0,
+    subgraphs: float = 0.0,
+    seed: int = 0,
+) -> nir.NIRGraph:
+    """Generates a random graph between an input and an output node.
+
+    The hidden nodes alternate between affine and LIF nodes in a chain, where every
+    node is connected to its predecessor and to `fan_in - 1` other, randomly chosen
+    earlier nodes. The last hidden node is connected to the output. All nodes have the
+    same width, so the inputs of every node can be summed.
+
+    Args:
+        num_nodes (int): The number of nodes at the top level, including the input
+            and output nodes. At least 3.
+        width (int): The number of neurons in every node. Defaults to 4.
+        fan_in (int): The number of inputs of every hidden node (fewer for the first
+            nodes). Defaults to 1.
+        locality (Optional[int]): If given, the inputs of a node are chosen among the
+            `locality` preceding nodes, so that the fan-out of every node is about
+            `fan_in`. Otherwise, they are chosen among all earlier nodes, so that the
+            early nodes become hubs with a large fan-out. Defaults to None.
+        recurrence (float): The fraction of hidden nodes with an additional input from
+            a later node, forming a recurrent loop. Defaults to 0.0.
+        subgraphs (float): The fraction of hidden LIF nodes that are replaced by nested
+            `nir.NIRGraph` nodes of a recurrent LIF population. Defaults to 0.0.
+        seed (int): The seed of the random number generator. Defaults to 0.
+
+    Raises:
+        ValueError: If there are fewer than 3 nodes or fewer than 1 input per node
+
+    Returns:
+        nir.NIRGraph: The generated graph
+    """
+    if num_nodes < 3:
+        raise ValueError("A synthetic graph requires at least 3 nodes")
+    if fan_in < 1:
+        raise ValueError("Every node requires at least one input")
+    rng = np.random.default_rng(seed)
+    hidden = [f"node{i}" for i in range(num_nodes - 2)]
+    nodes = {"input": nir.Input(np.array([width]))}
+    for i, name in enumerate(hidden):
+        if i % 2 == 0:
+            nodes[name] = _affine(rng, width)
+        elif rng.random() < subgraphs:
+            nodes[name] = _subgraph(rng, width)
+        else:
+            nodes[name] = _lif(width)
+    nodes["output"] = nir.Output(np.array([width]))
+
+    order = ["input", *hidden]
+    edges = []
+    for i, name in enumerate(hidden, start=1):
+        # Sources among the earlier nodes in `order`, besides the predecessor
+        first = 0 if locality is None else max(0, i - 1 - locality)
+        candidates = i - 1 - first
+        count = min(fan_in - 1, candidates)
+        sources = rng.choice(candidates, size=count, replace=False) + first
+        edges.append((order[i - 1], name))
+        edges.extend((order[j], name) for j in sorted(sources))
+    recurrent = np.flatnonzero(rng.random(len(hidden) - 1) < recurrence)
+    for i in recurrent:
+        later = rng.integers(i + 1, len(hidden))
+        edges.append((hidden[later], hidden[i]))
+    edges.append((hidden[-1], "output"))
+    return nir.NIRGraph(nodes, edges)
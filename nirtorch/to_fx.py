@@ -0,0 +1,335 @@
+import keyword
+from typing import Any, Dict, List, Tuple
+
+import torch
+import torch.fx as fx
+import torch.nn as nn
+from torch.utils import _pytree as pytree
+
+from .from_nir import GraphExecutor, GraphExecutorState
+
+
+class _StateUnflatten(nn.Module):
+    """Rebuilds a (nested) state object from its leaves."""
+
+    def __init__(self, spec: pytree.TreeSpec) -> None:
+        super().__init__()
+        self.spec = spec
+
+    def forward(self, *leaves):
+        return pytree.tree_unflatten(list(leaves), self.spec)
+
+
+class _StateFlatten(nn.Module):
+    """Flattens a (nested) state object into a tuple of leaves."""
+
+    def forward(self, state):
+        return tuple(pytree.tree_leaves(state))
+
+
+class _ModuleCall:
+    """Stands in for a module when its adapter calls it, and records the call in the
+    generated code."""
+
+    def __init__(self, tracer: fx.Tracer, target: str, module: nn.Module) -> None:
+        self.tracer = tracer
+        self.target = target
+        self.module = module
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.module, name)
+
+    def __call__(self, *args, **kwargs) -> fx.Proxy:
+        return self.tracer.create_proxy("call_module", self.target, args, kwargs)
+
+
+class FxGraphExecutor(fx.GraphModule):
+    """A `torch.fx.GraphModule` that executes a single (time)step of a NIR graph.
+
+    Unlike the `GraphExecutor`, the state is passed explicitly as a flat tuple of
+    tensors and the forward method is generated code, without any dictionaries or
+    branching. This makes the module compatible with `torch.compile` and fx-based
+    transformations, such as quantization.
+
+    The module is called as `output, *state = module(data, *state)`, where the state
+    contains the leaves of the state of every stateful module, followed by the
+    outputs of the nodes that are read by recurrent connections.
+    See `state_names` for the layout and `initial_state` for a state to start from.
+    If `return_state` is False, only the output is returned.
+    """
+
+    def __init__(
+        self,
+        root: Dict[str, nn.Module],
+        graph: fx.Graph,
+        state_names: List[str],
+        state_sample: List[Any],
+        state_specs: Dict[str, pytree.TreeSpec],
+        cache_names: List[str],
+    ) -> None:
+        super().__init__(root, graph, class_name="FxGraphExecutor")
+        self.state_names = state_names
+        self.state_specs = state_specs
+        self.cache_names = cache_names
+        self._state_sample = state_sample
+
+    def initial_state(self) -> Tuple[Any, ...]:
+        """Returns a state of zeros, with the shapes of the sample data used for code
+        generation.
+
+        This is equivalent to the initial state of the `GraphExecutor` for modules that
+        initialise their state with zeros. Otherwise, run a step with the
+        `GraphExecutor` and convert its state with `flatten_state`.
+        """
+        return tuple(
+            torch.zeros_like(x) if isinstance(x, torch.Tensor) else x
+            for x in self._state_sample
+        )
+
+    def to_torchscript(
+        self, sample_data: torch.Tensor, freeze: bool = True
+    ) -> torch.jit.ScriptModule:
+        """Compiles the module to TorchScript, to run without the Python interpreter.
+
+        The module is traced with the sample data and the initial state, so the
+        resulting forward has the typed signature
+        `(data: Tensor, *state: Tensor) -> Tuple[Tensor, ...]`.
+
+        Args:
+            sample_data (torch.Tensor): Input data for a single (time)step
+            freeze (bool): Whether to freeze the module, inlining the weights as
+                constants. Defaults to True.
+
+        Raises:
+            ValueError: If the state contains values that are not tensors
+
+        Returns:
+            torch.jit.ScriptModule: The compiled module, in evaluation mode
+        """
+        state = self.initial_state()
+        if not all(isinstance(x, torch.Tensor) for x in state):
+            raise ValueError("TorchScript requires every state to be a tensor")
+        training = self.training
+        try:
+            with torch.no_grad():
+                module = torch.jit.trace(self.eval(), (sample_data, *state))
+        finally:
+            self.train(training)
+        if freeze:
+            module = torch.jit.freeze(module)
+        return module
+
+    def export(
+        self, sample_data: torch.Tensor, dynamic_batch: bool = False
+    ) -> torch.export.ExportedProgram:
+        """Exports the module with `torch.export`, for ahead-of-time compilation.
+
+        The exported program has the same flat signature as this module,
+        `(data, *state) -> (output, *state)`, and can be saved with
+        `torch.export.save` and loaded without rebuilding the graph.
+
+        Args:
+            sample_data (torch.Tensor): Input data for a single (time)step
+            dynamic_batch (bool): Whether the first dimension of the data and of the
+                state tensors of the same size is a dynamic batch dimension. This
+                requires a batch size larger than 1 in the sample data.
+                Defaults to False.
+
+        Returns:
+            torch.export.ExportedProgram: The exported program
+        """
+        state = self.initial_state()
+        dynamic_shapes = None
+        if dynamic_batch:
+            batch = torch.export.Dim("batch")
+            dynamic_shapes = [{0: batch}] + [
+                {0: batch}
+                if isinstance(x, torch.Tensor)
+                and x.dim() > 0
+                and x.shape[0] == sample_data.shape[0]
+                else None
+                for x in state
+            ]
+        return torch.export.export(
+            self, (sample_data, *state), dynamic_shapes=dynamic_shapes
+        )
+
+    def flatten_state(self, state: GraphExecutorState) -> Tuple[Any, ...]:
+        """Converts the state of a `GraphExecutor` into the flat state of this
+        module."""
+        flat_state = []
+        for name, spec in self.state_specs.items():
+            leaves, state_spec = pytree.tree_flatten(state.state[name])
+            if state_spec != spec:
+                raise ValueError(f"Unexpected state structure for node {name}")
+            flat_state.extend(leaves)
+        for name in self.cache_names:
+            flat_state.append(state.cache[name])
+        return tuple(flat_state)
+
+
+def _identifier(name: str) -> str:
+    """Turns a node name into a valid Python identifier for the generated code."""
+    if not name.isidentifier() or keyword.iskeyword(name):
+        return f"node_{name}"
+    return name
+
+
+def _module_target(name: str, root: Dict[str, nn.Module]) -> str:
+    """Returns a valid, unique attribute name for a module in the generated code."""
+    target = _identifier(name)
+    while target in root:
+        target = f"_{target}"
+    return target
+
+
+def _children(spec: pytree.TreeSpec) -> List[pytree.TreeSpec]:
+    """Returns the specs of the children, across torch versions."""
+    if hasattr(spec, "children"):
+        return spec.children()
+    return spec.children_specs
+
+
+def _unflatten(
+    tracer: fx.Tracer,
+    root: Dict[str, nn.Module],
+    name: str,
+    spec: pytree.TreeSpec,
+    leaves: List[fx.Proxy],
+) -> Any:
+    """Rebuilds a state object from its leaves in the generated code.
+
+    Tuples and lists are rebuilt in place, such that adapters can unpack them. Other
+    containers are rebuilt by a module.
+    """
+    if spec.is_leaf():
+        return leaves[0]
+    if spec.type in (tuple, list):
+        children, start = [], 0
+        for i, child in enumerate(_children(spec)):
+            end = start + child.num_leaves
+            children.append(
+                _unflatten(tracer, root, f"{name}_{i}", child, leaves[start:end])
+            )
+            start = end
+        return spec.type(children)
+    target = f"_unflatten_{name}"
+    root[target] = _StateUnflatten(spec)
+    return tracer.create_proxy("call_module", target, tuple(leaves), {})
+
+
+def _flatten(
+    tracer: fx.Tracer,
+    root: Dict[str, nn.Module],
+    name: str,
+    spec: pytree.TreeSpec,
+    state: Any,
+) -> List[Any]:
+    """Returns the leaves of a state object in the generated code, in the order of
+    the structure recorded with the sample data."""
+    if spec.is_leaf():
+        return [state]
+    if spec.type in (tuple, list):
+        leaves = []
+        for i, child in enumerate(_children(spec)):
+            leaves += _flatten(tracer, root, f"{name}_{i}", child, state[i])
+        return leaves
+    target = f"_flatten_{name}"
+    root[target] = _StateFlatten()
+    leaves = tracer.create_proxy("call_module", target, (state,), {})
+    return [leaves[j] for j in range(spec.num_leaves)]
+
+
+def graph_executor_to_fx(
+    executor: GraphExecutor, sample_data: torch.Tensor
+) -> FxGraphExecutor:
+    """Generates a `torch.fx.GraphModule` that executes the plan of a `GraphExecutor`.
+
+    The sample data is executed once by the GraphExecutor to determine the structure
+    and shapes of the state of every stateful module.
+
+    Args:
+        executor (GraphExecutor): The executor to generate code for
+        sample_data (torch.Tensor): Input data for a single (time)step
+
+    Returns:
+        FxGraphExecutor: The generated module, sharing the modules of the executor
+    """
+    executor._update_graph_cache()
+    with torch.no_grad():
+        state = GraphExecutorState()
+        executor._step(executor.plan, sample_data, state, GraphExecutorState())
+
+    graph = fx.Graph()
+    tracer = fx.proxy.GraphAppendingTracer(graph)
+    root = {}
+    state_names, state_sample, state_specs = [], [], {}
+    data = fx.Proxy(graph.placeholder("data"), tracer)
+
+    # Placeholders for the state of every stateful module
+    state_leaves = {}
+    for step in executor.plan:
+        if step.split is None:
+            continue
+        leaves, state_specs[step.name] = pytree.tree_flatten(state.state[step.name])
+        state_leaves[step.name] = []
+        for j, leaf in enumerate(leaves):
+            name = f"{_identifier(step.name)}_state_{j}"
+            state_leaves[step.name].append(fx.Proxy(graph.placeholder(name), tracer))
+            state_names.append(name)
+            state_sample.append(leaf)
+
+    # Placeholders for the outputs of the previous step, read by recurrent edges
+    cache_names = list(
+        {name: None for step in executor.plan for name in step.recurrent_inputs}
+    )
+    cache_inputs = {}
+    for name in cache_names:
+        placeholder = graph.placeholder(f"{_identifier(name)}_cache")
+        cache_inputs[name] = fx.Proxy(placeholder, tracer)
+        state_names.append(f"{_identifier(name)}_cache")
+        state_sample.append(state.cache[name])
+
+    # Rebuild the state objects that are passed to the adapters
+    state_inputs = {
+        name: _unflatten(tracer, root, _identifier(name), spec, state_leaves[name])
+        for name, spec in state_specs.items()
+    }
+
+    values = {}
+    new_state = []
+    for step in executor.plan:
+        summed_inputs = [data] if step.takes_data else []
+        summed_inputs += [values[name] for name in step.inputs]
+        summed_inputs += [cache_inputs[name] for name in step.recurrent_inputs]
+        if len(summed_inputs) == 0:
+            raise ValueError("No inputs found for node {}".format(step.name))
+        summed = summed_inputs[0]
+        for x in summed_inputs[1:]:
+            summed = summed + x
+
+        target = _module_target(step.name, root)
+        root[target] = step.module
+        if step.call is None:
+            out = tracer.create_proxy("call_module", target, (summed,), {})
+        else:
+            # Let the adapter call a stand-in, which records the module call
+            module = _ModuleCall(tracer, target, step.module)
+            out = step.call(module, summed, state_inputs.get(step.name))
+        if step.split is not None:
+            out, step_state = step.split(step.module, out)
+            spec = state_specs[step.name]
+            name = _identifier(step.name)
+            new_state += _flatten(tracer, root, name, spec, step_state)
+        values[step.name] = out
+
+    new_state.extend(values[name] for name in cache_names)
+    output = values[executor.plan[-1].name]
+    if executor.return_state:
+        graph.output(tracer.create_arg((output, *new_state)))
+    else:
+        graph.output(tracer.create_arg(output))
+    graph.lint()
+    return FxGraphExecutor(
+        root, graph, state_names, state_sample, state_specs, cache_names
+    )
@@ -0,0 +1,106 @@
+import contextlib
+import json
+import os
+import pathlib
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+# The tracers that are currently recording, see `trace`
+_active_tracers: List["Tracer"] = []
+
+
+class Tracer:
+    """Records timed events in the Chrome trace-event format, which can be opened in
+    Perfetto (https://ui.perfetto.dev) or chrome://tracing.
+
+    The phases of `nirtorch.load` and `nirtorch.extract_nir_graph` are recorded while
+    the tracer is active (see `trace`). To record the (time)steps and node calls of a
+    `GraphExecutor`, pass the tracer to `GraphExecutor.profile`
+
+    >>> with nirtorch.tracing.trace() as tracer:
+    ...     executor = nirtorch.load(nir_graph, model_map)
+    ...     with executor.profile(tracer=tracer):
+    ...         executor.forward_sequence(data)
+    >>> tracer.save("trace.json")
+    """
+
+    def __init__(self) -> None:
+        self.events: List[Dict[str, Any]] = []
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+
+    def add_event(
+        self,
+        name: str,
+        category: str,
+        start: float,
+        end: float,
+        args: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Adds a complete event, with start and end in seconds from
+        `time.perf_counter`."""
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (start - self._origin) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": self._pid,
+            "tid": threading.get_ident(),
+        }
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str, **args: Any) -> Iterator[None]:
+        """Records the code within the context as an event."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_event(name, category, start, time.perf_counter(), args)
+
+    def to_json(self) -> Dict[str, Any]:
+        """Returns the events as a Chrome trace object."""
+        return {"traceEvents": self.events, "displayTimeUnit": "ms"}
+
+    def save(self, path: Union[str, pathlib.Path]) -> None:
+        """Writes the events to a JSON file."""
+        with open(path, "w") as f:
+            json.dump(self.to_json(), f)
+
+
+@contextlib.contextmanager
+def trace(tracer: Optional[Tracer] = None) -> Iterator[Tracer]:
+    """Activates a tracer, which records the phases of loading and extracting graphs
+    within the context.
+
+    Args:
+        tracer (Optional[Tracer]): The tracer to record to. Defaults to a new one.
+
+    Returns:
+        Iterator[Tracer]: The active tracer
+    """
+    tracer = tracer or Tracer()
+    _active_tracers.append(tracer)
+    try:
+        yield tracer
+    finally:
+        _active_tracers.remove(tracer)
+
+
+@contextlib.contextmanager
+def span(name: str, category: str, **args: Any) -> Iterator[None]:
+    """Records the code within the context as an event of all active tracers, if any."""
+    if not _active_tracers:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        for tracer in _active_tracers:
+            tracer.add_event(name, category, start, end, args)
@@ -0,0 +1,123 @@
+import nir
+import numpy as np
+import torch
+
+import nirtorch
+from nirtorch import adapters
+from nirtorch.adapters import get_adapter
+
+from .test_from_nir import _torch_model_map
+
+
+class _Neuron(torch.nn.Module):
+    """Stateful module that does not name its state argument `state`."""
+
+    def forward(self, x, v=None):
+        if v is None:
+            v = torch.zeros_like(x)
+        v = v + x
+        return v, v
+
+
+def _fake_module(package: str, name: str, **attributes) -> torch.nn.Module:
+    cls = type(name, (torch.nn.Module,), {"__module__": f"{package}._neurons"})
+    module = cls()
+    module.__dict__.update(attributes)
+    return module
+
+
+def test_framework_adapters():
+    leaky = _fake_module("snntorch", "Leaky", init_hidden=False)
+    assert get_adapter(leaky).is_stateful(leaky)
+    assert not get_adapter(leaky).state_is_output(leaky)
+    rsynaptic = _fake_module("snntorch", "RSynaptic", init_hidden=False)
+    assert get_adapter(rsynaptic).state_is_output(rsynaptic)
+    hidden = _fake_module("snntorch", "RSynaptic", init_hidden=True)
+    assert not get_adapter(hidden).is_stateful(hidden)
+    assert not get_adapter(hidden).state_is_output(hidden)
+    sinabs = _fake_module("sinabs", "LIF")
+    assert not get_adapter(sinabs).is_stateful(sinabs)
+    assert get_adapter(torch.nn.Linear(1, 1)) is adapters._default_adapter
+
+
+def test_register_adapter():
+    class _NeuronAdapter(nirtorch.ModuleAdapter):
+        def matches(self, module):
+            return isinstance(module, _Neuron)
+
+        def is_stateful(self, module):
+            return True
+
+    def _map(m):
+        if isinstance(m, nir.I):
+            return _Neuron()
+        return _torch_model_map(m)
+
+    g = nir.NIRGraph(
+        nodes={"in": nir.Input(np.ones(1)), "b": nir.I(np.ones(1))},
+        edges=[("in", "b")],
+    )
+    assert not nirtorch.load(g, _map).plan[-1].stateful
+    adapter = _NeuronAdapter()
+    nirtorch.register_adapter(adapter)
+    try:
+        m = nirtorch.load(g, _map)
+        assert m.plan[-1].stateful
+        out, state = m(torch.ones(1, 1))
+        out, state = m(torch.ones(1, 1), state)
+        assert torch.allclose(out, torch.tensor(2.0))
+    finally:
+        adapters._adapters.remove(adapter)
+
+
+class _DictNeuron(torch.nn.Module):
+    """Stateful module with a keyword-only state, returned as a dictionary."""
+
+    def forward(self, x, *, v=None):
+        if v is None:
+            v = torch.zeros_like(x)
+        v = v + x
+        return {"spikes": v, "v": v}
+
+
+def test_adapter_call_and_split():
+    class _DictAdapter(nirtorch.ModuleAdapter):
+        def matches(self, module):
+            return isinstance(module, _DictNeuron)
+
+        def is_stateful(self, module):
+            return True
+
+        def call(self, module, input, state):
+            return module(input, v=None if state is None else state["v"])
+
+        def split(self, module, output):
+            return output["spikes"], {"v": output["v"]}
+
+    def _map(m):
+        if isinstance(m, nir.I):
+            return _DictNeuron()
+        return _torch_model_map(m)
+
+    g = nir.NIRGraph(
+        nodes={"in": nir.Input(np.ones(1)), "b": nir.I(np.ones(1))},
+        edges=[("in", "b")],
+    )
+    adapter = _DictAdapter()
+    nirtorch.register_adapter(adapter)
+    try:
+        data = torch.ones(1, 1)
+        m = nirtorch.load(g, _map)
+        out, state = m(data)
+        out, state = m(data, state)
+        assert torch.allclose(out, torch.tensor(2.0))
+        assert torch.allclose(state.state["b"]["v"], torch.tensor(2.0))
+
+        fx_module = nirtorch.load(g, _map, as_fx=True, sample_data=data)
+        assert fx_module.state_names == ["b_state_0"]
+        flat_state = fx_module.initial_state()
+        for expected in (1.0, 2.0, 3.0):
+            out, *flat_state = fx_module(data, *flat_state)
+            assert torch.allclose(out, torch.tensor(expected))
+    finally:
+        adapters._adapters.remove(adapter)
@@ -0,0 +1,66 @@
+import pytest
+import torch
+
+from nirtorch.arena import ActivationArena, FanInAccumulator, assign_slots
+
+
+def test_assign_slots():
+    assert assign_slots([]) == []
+    assert assign_slots([(0, 1), None, (1, 2), (2, 3), (4, 4)]) == [0, None, 1, 0, 0]
+    # Overlapping lifetimes never share a slot
+    assert assign_slots([(0, 5), (1, 2), (3, 4)]) == [0, 1, 1]
+
+
+def test_arena_sum():
+    arena = ActivationArena(1)
+    x, y, z = torch.rand(3, 2, 4)
+    out = arena.sum(0, [x, y, z])
+    assert torch.allclose(out, x + y + z)
+    assert arena.owns(out) and not arena.owns(x)
+    # Smaller sums reuse the buffer
+    assert arena.sum(0, [x[0], y[0]]).data_ptr() == out.data_ptr()
+    protected = arena.protect((out, [x]))
+    assert not arena.owns(protected[0]) and protected[1][0] is x
+    # Mixed dtypes and shapes are promoted and broadcast
+    out = arena.sum(0, [x, y.double(), z[0]])
+    assert out.dtype == torch.float64 and arena.owns(out)
+    assert torch.allclose(out, x + y.double() + z[0])
+    assert not ActivationArena.can_sum([x, z])
+    with torch.no_grad():
+        assert ActivationArena.can_sum([x, z])
+        assert not ActivationArena.can_sum([x, y.requires_grad_()])
+
+
+def test_fan_in_accumulator():
+    accumulate = FanInAccumulator()
+    tensors = [torch.rand(2, 3) for _ in range(64)]
+    assert torch.allclose(accumulate(tensors), torch.stack(tensors).sum(0))
+    # Spikes are counted, like torch.sum
+    spikes = [torch.ones(3, dtype=torch.bool)] * 3
+    assert torch.equal(accumulate(spikes), torch.full((3,), 3))
+    out = torch.empty(3, dtype=torch.int64)
+    assert accumulate(spikes, out=out) is out
+    # The inputs are not modified, also if gradients are required
+    x = torch.rand(3, requires_grad=True)
+    accumulate([x, x, x]).sum().backward()
+    assert torch.equal(x.grad, torch.full((3,), 3.0))
+
+    accumulate = FanInAccumulator(torch.float32)
+    assert accumulate(spikes).dtype == torch.float32
+    with pytest.raises(TypeError):
+        FanInAccumulator(torch.int64)([torch.rand(3), torch.rand(3)])
+
+
+def test_fan_in_accumulator_preallocated_integers():
+    arena = ActivationArena(1)
+    # Bool and uint8 inputs are summed as int64, without overflowing
+    spikes = [torch.tensor([True, True]), torch.tensor([True, False])]
+    expected = torch.stack(spikes).sum(0)
+    assert torch.equal(arena.sum(0, spikes), expected)
+    assert torch.equal(FanInAccumulator()(spikes), expected)
+    counts = [
+        torch.tensor([200], dtype=torch.uint8),
+        torch.tensor([100], dtype=torch.uint8),
+    ]
+    assert torch.equal(arena.sum(0, counts), torch.tensor([300]))
+    assert torch.equal(FanInAccumulator()(counts), torch.tensor([300]))
@@ -156,3 +156,402 @@ def test_import_braille():
     g = nir.read("tests/braille.nir")
     m = load(g, _recurrent_model_map)
     assert m(torch.empty(1, 12))[0].shape == (1, 7)
+
+
+def test_execute_updates_on_graph_change():
+    w = np.ones((1, 1))
+    g = nir.NIRGraph(
+        nodes={"in": nir.Input(np.ones(1)), "a": nir.Linear(w), "b": nir.Linear(w)},
+        edges=[("in", "a"), ("a", "b")],
+    )
+    m = load(g, _torch_model_map)
+    version = m.graph.version
+    data = torch.ones(1, 1)
+    assert torch.allclose(m(data)[0], torch.tensor(1.0))
+    # Add a recurrent edge after construction
+    m.graph.add_edge(m.b, m.a)
+    assert m.graph.version > version
+    out, state = m(data)
+    out, state = m(data, state)
+    assert torch.allclose(out, torch.tensor(2.0))
+
+
+def test_execution_plan_recurrent():
+    w = np.ones((1, 1))
+    g = nir.NIRGraph(
+        nodes={"in": nir.Input(np.ones(1)), "a": nir.Linear(w), "b": nir.Linear(w)},
+        edges=[("in", "a"), ("a", "b"), ("b", "a")],
+    )
+    m = load(g, _torch_model_map)
+    assert [step.name for step in m.plan] == ["in", "a", "b"]
+    assert m.plan[0].takes_data
+    assert m.plan[1].inputs == ("in",)
+    assert m.plan[1].recurrent_inputs == ("b",)
+    assert m.plan[2].inputs == ("a",)
+    assert not any(step.stateful for step in m.plan)
+
+
+def test_forward_sequence():
+    g = nir.read("tests/braille.nir")
+    m = load(g, _recurrent_model_map)
+    data = torch.rand(5, 2, 12)
+
+    expected, state = [], None
+    for data_t in data:
+        out, state = m(data_t, state)
+        expected.append(out)
+    outputs, final_state = m.forward_sequence(data)
+    assert outputs.shape == (5, 2, 7)
+    assert torch.allclose(outputs, torch.stack(expected))
+    assert final_state.cache.keys() == state.cache.keys()
+    for key, value in state.cache.items():
+        assert torch.allclose(final_state.cache[key], value)
+
+    # Continuing from a state does not modify that state
+    cache = dict(final_state.cache)
+    outputs, _ = m.forward_sequence(data, final_state)
+    assert final_state.cache == cache
+
+    m = load(g, _recurrent_model_map, return_state=False)
+    assert m.forward_sequence(data).shape == (5, 2, 7)
+
+
+class _Integrator(torch.nn.Module):
+    def forward(self, x, state=None):
+        if state is None:
+            state = torch.zeros_like(x)
+        state = state + x
+        return state, state
+
+
+def test_forward_sequence_batch_time():
+    w = np.random.randn(3, 3)
+
+    def _integrator_map(m):
+        if isinstance(m, nir.I):
+            return _Integrator()
+        return _torch_model_map(m)
+
+    g = nir.NIRGraph(
+        nodes={
+            "in": nir.Input(np.ones(3)),
+            "a": nir.Linear(w),
+            "b": nir.I(np.ones(3)),
+            "c": nir.Linear(w),
+            "d": nir.Linear(w),
+            "out": nir.Output(np.ones(3)),
+        },
+        edges=[("in", "a"), ("a", "b"), ("b", "c"), ("c", "d"), ("d", "out")],
+    )
+    m = load(g, _integrator_map)
+    assert m.time_batched_steps == {"in", "a", "c", "d", "out"}
+    assert [segment.batched for segment in m.time_segments] == [True, False, True]
+    data = torch.rand(4, 2, 3)
+    expected, expected_state = m.forward_sequence(data)
+    actual, state = m.forward_sequence(data, batch_time=True)
+    assert torch.allclose(actual, expected)
+    assert state.cache.keys() == expected_state.cache.keys()
+    assert torch.allclose(state.state["b"][0], expected_state.state["b"][0])
+
+
+def test_forward_sequence_batch_time_feedforward():
+    g = nir.read("tests/braille.nir")
+    m = load(g, _recurrent_model_map)
+    assert m.time_batched_steps == {"input", "fc1", "fc2", "lif2", "output"}
+    data = torch.rand(5, 2, 12)
+    outputs, state = m.forward_sequence(data, batch_time=True)
+    expected, expected_state = m.forward_sequence(data)
+    assert torch.allclose(outputs, expected)
+    for key, value in expected_state.cache.items():
+        assert torch.allclose(state.cache[key], value)
+
+    g = nir.NIRGraph(
+        nodes={"in": nir.Input(np.ones(1)), "a": nir.Linear(np.ones((1, 1)))},
+        edges=[("in", "a")],
+    )
+    m = load(g, _torch_model_map)
+    data = torch.rand(5, 2, 1)
+    outputs, state = m.forward_sequence(data, batch_time=True)
+    assert torch.allclose(outputs, m.forward_sequence(data)[0])
+    assert torch.allclose(state.cache["a"], outputs[-1])
+
+
+def test_execute_branched():
+    w = np.ones((1, 1))
+    g = nir.NIRGraph(
+        nodes={
+            "in": nir.Input(np.ones(1)),
+            "a": nir.Linear(w),
+            "b": nir.Linear(w),
+            "c": nir.Linear(w),
+        },
+        edges=[("in", "a"), ("in", "b"), ("a", "c"), ("b", "c")],
+    )
+    m = load(g, _torch_model_map)
+    assert m.execution_order[-1].name == "c"
+    assert m.get_execution_order() == m.execution_order
+    assert m.plan[-1].inputs == ("a", "b")
+    assert not any(step.recurrent_inputs for step in m.plan)
+    # Both branches arrive at c in the same step
+    assert torch.allclose(m(torch.ones(1, 1))[0], torch.tensor(2.0))
+
+
+def test_execute_releases_dead_outputs():
+    g = nir.read("tests/braille.nir")
+    m = load(g, _recurrent_model_map)
+    assert m.persistent_outputs == {"lif1_w_rec", "output"}
+    releases = {step.name: step.release for step in m.plan}
+    assert releases["fc1"] == ("input",)
+    assert releases["fc2"] == ("lif1_lif",)
+    assert releases["lif1_w_rec"] == ()
+    _, state = m(torch.rand(2, 12))
+    assert state.cache.keys() == {"lif1_w_rec", "output"}
+    outputs, state = m.forward_sequence(torch.rand(3, 2, 12), batch_time=True)
+    assert state.cache.keys() == {"lif1_w_rec", "output"}
+
+
+def test_execute_persistent_state():
+    data = torch.rand(6, 2, 3)
+
+    def _map(m):
+        if isinstance(m, nir.I):
+            return _Integrator()
+        return _torch_model_map(m)
+
+    g = nir.NIRGraph(
+        nodes={
+            "in": nir.Input(np.ones(3)),
+            "a": nir.Linear(np.random.randn(3, 3)),
+            "b": nir.I(np.ones(3)),
+        },
+        edges=[("in", "a"), ("a", "b")],
+    )
+    m = load(g, _map)
+    expected, state = [], None
+    for data_t in data:
+        out, state = m(data_t, state)
+        expected.append(out)
+
+    m.persistent_state = True
+    outputs, states, state = [], [], None
+    with torch.no_grad():
+        for data_t in data:
+            out, state = m(data_t, state)
+            outputs.append(out)
+            states.append(state)
+    # Two state objects are reused, and the state tensors are overwritten in place
+    assert states[0] is states[2] is states[4]
+    assert states[1] is states[3] is states[5]
+    assert states[2].state["b"][0] is states[4].state["b"][0]
+    # The outputs are not overwritten
+    assert torch.allclose(torch.stack(outputs), torch.stack(expected))
+    outputs = m.forward_sequence(data)[0]
+    assert torch.allclose(outputs, torch.stack(expected))
+
+
+class _Delay(torch.nn.Module):
+    def forward(self, x, state=None):
+        if state is None:
+            state = torch.zeros_like(x)
+        return state, x.clone()
+
+
+def test_execute_persistent_state_returns_state():
+    # The delay returns its incoming state, which is overwritten two steps later
+    g = nir.NIRGraph(
+        nodes={"in": nir.Input(np.ones(1)), "b": nir.I(np.ones(1))},
+        edges=[("in", "b")],
+    )
+    m = load(g, lambda n: _Delay() if isinstance(n, nir.I) else _torch_model_map(n))
+    m.persistent_state = True
+    outputs, state = [], None
+    with torch.no_grad():
+        for t in range(5):
+            out, state = m(torch.full((1,), float(t)), state)
+            outputs.append(out)
+    assert torch.stack(outputs).flatten().tolist() == [0, 0, 1, 2, 3]
+
+
+def test_execute_activation_arena():
+    w = np.random.randn(3, 3)
+    g = nir.NIRGraph(
+        nodes={
+            "in": nir.Input(np.ones(3)),
+            "a": nir.Linear(w),
+            "b": nir.Linear(w),
+            "m1": nir.Output(np.ones(3)),
+            "c": nir.Linear(w),
+            "d": nir.Linear(w),
+            "m2": nir.Output(np.ones(3)),
+        },
+        edges=[
+            ("in", "a"),
+            ("in", "b"),
+            ("a", "m1"),
+            ("b", "m1"),
+            ("m1", "c"),
+            ("m1", "d"),
+            ("c", "m2"),
+            ("d", "m2"),
+        ],
+    )
+    m = load(g, _torch_model_map, return_state=False)
+    slots = {step.name: step.arena_slot for step in m.plan}
+    # The identities return their summed inputs, and c and d may return their input
+    # as well, so the slot of m1 is alive until m2
+    assert slots["m1"] == 0 and slots["m2"] == 1
+    assert m.arena.buffers == [None, None]
+    data = torch.rand(4, 2, 3)
+    expected = [m(data_t) for data_t in data]
+    m.activation_arena = True
+    with torch.no_grad():
+        outputs = [m(data_t) for data_t in data]
+        buffer = m.arena.buffers[0]
+        m(data[0])
+    # The buffer is reused, and the returned outputs are not overwritten
+    assert m.arena.buffers[0] is buffer
+    assert torch.allclose(torch.stack(outputs), torch.stack(expected))
+
+    g = nir.read("tests/braille.nir")
+    m = load(g, _recurrent_model_map)
+    data = torch.rand(5, 2, 12)
+    expected, expected_state = m.forward_sequence(data)
+    m.activation_arena = True
+    with torch.no_grad():
+        outputs, state = m.forward_sequence(data)
+    assert torch.allclose(outputs, expected)
+    for key, value in expected_state.cache.items():
+        assert torch.allclose(state.cache[key], value)
+
+
+def test_execute_activation_arena_aliased_slot():
+    # g aliases the slot of f, and must not be overwritten by the sum of h
+    w = np.eye(3) * 2
+    g = nir.NIRGraph(
+        nodes={
+            "in": nir.Input(np.ones(3)),
+            "a": nir.Linear(w),
+            "b": nir.Linear(w),
+            "f": nir.Output(np.ones(3)),
+            "g": nir.Output(np.ones(3)),
+            "c": nir.Linear(w),
+            "d": nir.Linear(w),
+            "h": nir.Output(np.ones(3)),
+            "k": nir.Output(np.ones(3)),
+        },
+        edges=[
+            ("in", "a"),
+            ("in", "b"),
+            ("a", "f"),
+            ("b", "f"),
+            ("f", "g"),
+            ("g", "c"),
+            ("g", "d"),
+            ("c", "h"),
+            ("d", "h"),
+            ("g", "k"),
+            ("h", "k"),
+        ],
+    )
+    m = load(g, _torch_model_map, return_state=False)
+    slots = {step.name: step.arena_slot for step in m.plan}
+    assert len({slots["f"], slots["h"], slots["k"]}) == 3
+    data = torch.ones(1, 3)
+    with torch.no_grad():
+        expected = m(data)
+        m.activation_arena = True
+        assert torch.allclose(m(data), expected)
+        assert torch.allclose(m(data), torch.full((1, 3), 20.0))
+
+
+def test_execute_activation_arena_backward():
+    # The sum of c is saved by the linear layer d for the backward pass
+    g = nir.NIRGraph(
+        nodes={
+            "in": nir.Input(np.ones(3)),
+            "a": nir.Output(np.ones(3)),
+            "b": nir.Output(np.ones(3)),
+            "c": nir.Output(np.ones(3)),
+            "d": nir.Linear(np.eye(3)),
+        },
+        edges=[("in", "a"), ("in", "b"), ("a", "c"), ("b", "c"), ("c", "d")],
+    )
+    m = load(g, _torch_model_map)
+    m.activation_arena = True
+    out = m.forward_sequence(torch.rand(4, 1, 3))[0]
+    out.sum().backward()
+    assert m.execution_order[-1].elem.weight.grad is not None
+
+
+def test_execute_activation_arena_recurrent_input():
+    # r reads x from the previous step, which is missing in the first step, so r
+    # aliases the slot of m1, which must not be reused by m2
+    w = np.eye(3) * 2
+    g = nir.NIRGraph(
+        nodes={
+            "in": nir.Input(np.ones(3)),
+            "a": nir.Linear(w),
+            "b": nir.Linear(w),
+            "m1": nir.Output(np.ones(3)),
+            "r": nir.Output(np.ones(3)),
+            "x": nir.Output(np.ones(3)),
+            "c": nir.Linear(w),
+            "d": nir.Linear(w),
+            "m2": nir.Output(np.ones(3)),
+            "k": nir.Output(np.ones(3)),
+        },
+        edges=[
+            ("in", "a"),
+            ("in", "b"),
+            ("a", "m1"),
+            ("b", "m1"),
+            ("m1", "r"),
+            ("x", "r"),
+            ("r", "x"),
+            ("r", "c"),
+            ("r", "d"),
+            ("c", "m2"),
+            ("d", "m2"),
+            ("m2", "k"),
+            ("r", "k"),
+        ],
+    )
+    m = load(g, _torch_model_map)
+    data = torch.ones(1, 3)
+    with torch.no_grad():
+        expected = m(data)[0]
+        m.activation_arena = True
+        assert torch.allclose(m(data)[0], expected)
+
+
+def test_execute_profile():
+    g = nir.read("tests/braille.nir")
+    m = load(g, _recurrent_model_map)
+    assert m.profiler is None
+    data = torch.rand(3, 2, 12)
+    with m.profile() as profiler:
+        expected, _ = m.forward_sequence(data)
+    assert m.profiler is None
+    assert len(profiler.step_times) == 3
+    assert {step.name for step in m.plan} == profiler.nodes.keys()
+    fc1 = profiler.nodes["fc1"]
+    assert fc1.calls == 3
+    assert fc1.input_shapes == {((2, 12),)}
+    assert fc1.output_shapes == {((2, 38),)}
+    assert fc1.output_bytes == 3 * 2 * 38 * 4
+    assert len(profiler.step_output_bytes) == 3
+    assert sum(profiler.step_output_bytes) == sum(
+        p.output_bytes for p in profiler.nodes.values()
+    )
+    summary = profiler.summary()
+    assert [p.total_time for p in summary] == sorted(
+        (p.total_time for p in summary), reverse=True
+    )
+    assert profiler.report().splitlines()[1].startswith(summary[0].name)
+
+    # Time-batched nodes are called once for all timesteps
+    with m.profile() as profiler:
+        outputs, _ = m.forward_sequence(data, batch_time=True)
+    assert torch.allclose(outputs, expected)
+    assert profiler.nodes["fc1"].calls == 1
+    assert profiler.nodes["fc1"].input_shapes == {((6, 12),)}
@@ -334,3 +334,200 @@ def test_captures_recurrence_manually():
     # TODO: Pass recursively
     # assert d.nodes["1"].nodes.keys() == {"i"}
     # assert d.nodes["1"].edges == [("1.i", "1.i")]
+
+
+def test_frozen_graph_predecessors():
+    graph = extract_torch_graph(my_branched_model, sample_data=data)
+    graph = graph.ignore_tensors()
+    frozen = graph.freeze()
+    for i, node in enumerate(graph.node_list):
+        sources = [graph.node_list[j] for j in frozen.predecessors(i)]
+        assert sources == graph.find_source_nodes_of(node)
+
+
+def test_node_index():
+    graph = extract_torch_graph(my_branched_model, sample_data=data)
+    assert graph.node_map_by_id is graph.node_map_by_id
+    assert graph.node_map_by_id == {n.name: n for n in graph.node_list}
+    for node in graph.node_list:
+        assert node.elem in graph
+        assert graph.find_node(node.elem) is node
+        assert graph.add_or_get_node_for_elem(node.elem) is node
+    # Equal tensors are still different elements
+    tensor = next(n.elem for n in graph.node_list if isinstance(n.elem, torch.Tensor))
+    assert tensor.clone() not in graph
+    with pytest.raises(ValueError):
+        graph.find_node(tensor.clone())
+    # The index is maintained when adding nodes
+    node = graph.add_or_get_node_for_elem(tensor.clone())
+    assert graph.find_node(node.elem) is node
+    assert graph.node_map_by_id[node.name] is node
+
+
+def test_extract_torch_graph_long_chain():
+    model = nn.Sequential(*[nn.Linear(2, 2) for _ in range(3000)])
+    graph = extract_torch_graph(model, sample_data=torch.rand(1, 2), model_name=None)
+    assert len(graph.node_list) == 2 * 3000 + 1
+    graph = graph.ignore_tensors()
+    assert len(graph.node_list) == 3000
+    assert graph.find_source_nodes_of(graph.node_list[-1]) == [graph.node_list[-2]]
+
+
+def test_incoming_nodes():
+    graph = extract_torch_graph(my_branched_model, sample_data=data)
+    for node in graph.node_list:
+        for outnode in node.outgoing_nodes:
+            assert outnode.incoming_nodes.count(node) == 1
+        for source in node.incoming_nodes:
+            assert node in source.outgoing_nodes
+
+
+def _edge_list(graph):
+    return [
+        (node.name, outnode.name, shape)
+        for node in graph.node_list
+        for outnode, shape in node.outgoing_nodes.items()
+    ]
+
+
+def test_freeze():
+    graph = extract_torch_graph(mydeepmodel, sample_data=data)
+    frozen = graph.freeze()
+    assert frozen.num_nodes == len(graph.node_list)
+    assert frozen.num_edges == len(_edge_list(graph))
+    assert not frozen.indices.flags.writeable
+    for i, node in enumerate(graph.node_list):
+        assert frozen.elems[i] is node.elem
+        assert [frozen.names[j] for j in frozen.successors(i)] == [
+            n.name for n in node.outgoing_nodes
+        ]
+        assert [frozen.names[j] for j in frozen.predecessors(i)] == [
+            n.name for n in graph.find_source_nodes_of(node)
+        ]
+    thawed = frozen.thaw()
+    assert [n.name for n in thawed.node_list] == [n.name for n in graph.node_list]
+    assert _edge_list(thawed) == _edge_list(graph)
+
+
+def test_frozen_graph_passes():
+    graph = extract_torch_graph(mydeepmodel, sample_data=data)
+    frozen = graph.freeze()
+    expected = graph.ignore_tensors()
+    actual = frozen.ignore_tensors().thaw()
+    assert [n.name for n in actual.node_list] == [n.name for n in expected.node_list]
+    assert _edge_list(actual) == _edge_list(expected)
+    assert actual.module_names == expected.module_names
+
+    expected = expected.leaf_only()
+    actual = frozen.ignore_tensors().leaf_only().thaw()
+    assert [n.name for n in actual.node_list] == [n.name for n in expected.node_list]
+    assert _edge_list(actual) == _edge_list(expected)
+    assert actual.module_names == expected.module_names
+
+
+def test_frozen_graph_strongly_connected_components():
+    from nirtorch.from_nir import _mod_nir_to_graph, _switch_models_with_map
+    from nirtorch.synthetic import default_model_map, synthetic_graph
+
+    nir_graph = synthetic_graph(200, fan_in=2, recurrence=0.1)
+    module_graph = _switch_models_with_map(nir_graph, default_model_map)
+    graph = _mod_nir_to_graph(module_graph, nir_graph.nodes)
+    frozen = graph.freeze()
+    components = frozen.strongly_connected_components()
+    # Two nodes are in the same component if they can reach each other
+    reachable = []
+    for i in range(frozen.num_nodes):
+        seen, stack = {i}, [i]
+        while stack:
+            for j in frozen.successors(stack.pop()).tolist():
+                if j not in seen:
+                    seen.add(j)
+                    stack.append(j)
+        reachable.append(seen)
+    expected = {
+        frozenset(j for j in reachable[i] if i in reachable[j])
+        for i in range(frozen.num_nodes)
+    }
+    assert {frozenset(c.tolist()) for c in components} == expected
+    assert sum(len(c) for c in components) == frozen.num_nodes
+    assert any(len(c) > 1 for c in components)
+    position = {i: k for k, c in enumerate(components) for i in c.tolist()}
+    for k, children in enumerate(frozen.condensation(components)):
+        assert all(child > k for child in children)
+        for i in components[k].tolist():
+            for j in frozen.successors(i).tolist():
+                assert position[j] == k or position[j] in children
+
+
+class _Block(nn.Module):
+    def __init__(self) -> None:
+        super().__init__()
+        self.lin = nn.Linear(1, 1)
+        self.relu = nn.ReLU()
+
+    def forward(self, data):
+        return self.relu(self.lin(data))
+
+
+def test_ignore_submodules_of_many_blocks():
+    num_blocks = 5000
+    model = nn.Sequential(*[_Block() for _ in range(num_blocks)])
+    graph = extract_torch_graph(model, sample_data=torch.rand(1, 1), model_name=None)
+    graph = graph.ignore_tensors().ignore_submodules_of([_Block])
+    assert len(graph.node_list) == num_blocks
+    assert all(isinstance(node.elem, _Block) for node in graph.node_list)
+    assert graph.find_source_nodes_of(graph.node_list[-1]) == [graph.node_list[-2]]
+    assert graph.leaf_only().module_names == graph.module_names
+
+
+def _edge_set(graph):
+    return {
+        (node.name, outnode.name, tuple(shape))
+        for node in graph.node_list
+        for outnode, shape in node.outgoing_nodes.items()
+    }
+
+
+@pytest.mark.parametrize(
+    "model", [my_branched_model, mydeepmodel, NorseStatefulModel()]
+)
+def test_extract_torch_graph_modules_only(model):
+    for model_name in ("model", None):
+        expected = extract_torch_graph(
+            model, sample_data=data, model_name=model_name
+        ).ignore_tensors()
+        graph = extract_torch_graph(
+            model, sample_data=data, model_name=model_name, modules_only=True
+        )
+        assert [n.name for n in graph.node_list] == [n.name for n in expected.node_list]
+        assert _edge_set(graph) == _edge_set(expected)
+        assert graph.module_output_types == expected.module_output_types
+
+
+def test_extract_torch_graph_modules_only_releases_tensors():
+    import weakref
+
+    class Recorder(nn.Module):
+        def __init__(self) -> None:
+            super().__init__()
+            self.outputs = []
+
+        def forward(self, data):
+            out = data + 1
+            self.outputs.append(weakref.ref(out))
+            return out
+
+    model = nn.Sequential(*[Recorder() for _ in range(10)])
+    graph = extract_torch_graph(model, sample_data=data, model_name=None)
+    assert all(ref() is not None for mod in model for ref in mod.outputs)
+    del graph
+    for mod in model:
+        mod.outputs.clear()
+
+    graph = extract_torch_graph(
+        model, sample_data=data, model_name=None, modules_only=True
+    )
+    # Neither the tracer nor the graph keep the intermediate tensors alive
+    assert [ref() is None for mod in model for ref in mod.outputs] == [True] * 10
+    assert len(graph.node_list) == 10
+    assert graph.find_source_nodes_of(graph.node_list[-1]) == [graph.node_list[-2]]
@@ -1,6 +1,8 @@
 from collections import defaultdict
 
-from nirtorch.graph_utils import trace_execution
+import pytest
+
+from nirtorch.graph_utils import find_all_ancestors, topological_sort, trace_execution
 
 
 class StringNode:
@@ -43,3 +45,33 @@ def test_trace_recursive_complex():
     node = StringNode.from_string("a-b b-a b-c b-c c-d d-e")
     seen = trace_execution(node, node.get_children)
     assert "".join([x.name for x in seen]) == "abcde"
+
+
+def test_trace_deep():
+    graph = " ".join(f"{chr(i)}-{chr(i + 1)}" for i in range(1000, 51000))
+    node = StringNode.from_string(graph)
+    seen = trace_execution(node, node.get_children)
+    assert len(seen) == 50001
+    assert seen[-1].name == chr(51000)
+
+
+def test_topological_sort_stable():
+    node = StringNode.from_string("a-b a-c b-d c-d d-e")
+    order = topological_sort([node], node.get_children)
+    assert "".join([x.name for x in order]) == "abcde"
+    node = StringNode.from_string("a-c a-b b-d c-d d-e")
+    order = topological_sort([node], node.get_children)
+    assert "".join([x.name for x in order]) == "acbde"
+
+
+def test_topological_sort_cycle():
+    node = StringNode.from_string("a-b b-c c-b")
+    with pytest.raises(ValueError):
+        topological_sort([node], node.get_children)
+
+
+def test_find_all_ancestors():
+    edges = [("a", "b"), ("b", "c"), ("c", "d"), ("x", "c"), ("d", "b")]
+    assert find_all_ancestors("d", edges, roots=[]) == {"a", "b", "c", "d", "x"}
+    assert find_all_ancestors("c", edges, roots=["b"]) == {"b", "x"}
+    assert find_all_ancestors("a", edges, roots=["a"]) == set()
@@ -0,0 +1,48 @@
+import nir
+import numpy as np
+import pytest
+import torch
+
+import nirtorch
+from nirtorch.synthetic import default_model_map, synthetic_graph
+
+
+def test_synthetic_graph_structure():
+    g = synthetic_graph(100, fan_in=3)
+    assert len(g.nodes) == 100
+    # The first hidden nodes have fewer earlier nodes to connect to
+    assert len(g.edges) == 98 + (0 + 1 + 96 * 2) + 1
+    sources = {}
+    for src, dst in g.edges:
+        sources.setdefault(dst, []).append(src)
+    assert all(len(set(s)) == len(s) for s in sources.values())
+    assert sources["output"] == ["node97"]
+
+    local = synthetic_graph(100, fan_in=3, locality=4)
+    order = ["input"] + [f"node{i}" for i in range(98)]
+    for src, dst in local.edges:
+        if dst != "output":
+            assert 0 < order.index(dst) - order.index(src) <= 5
+
+    assert (
+        synthetic_graph(50, fan_in=2, seed=1).edges
+        == synthetic_graph(50, fan_in=2, seed=1).edges
+    )
+    with pytest.raises(ValueError):
+        synthetic_graph(2)
+
+
+def test_synthetic_graph_execute():
+    g = synthetic_graph(60, fan_in=2, recurrence=0.1, subgraphs=0.5, seed=3)
+    assert any(isinstance(node, nir.NIRGraph) for node in g.nodes.values())
+    m = nirtorch.load(g, default_model_map)
+    assert any(len(component) > 1 for component in m.components)
+    data = torch.rand(4, 2, 4)
+    outputs, state = m.forward_sequence(data)
+    assert outputs.shape == (4, 2, 4)
+    expected, state = [], None
+    for data_t in data:
+        out, state = m(data_t, state)
+        expected.append(out)
+    assert torch.allclose(outputs, torch.stack(expected))
+    assert np.isfinite(outputs.numpy()).all()
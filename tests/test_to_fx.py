@@ -0,0 +1,159 @@
+import io
+
+import nir
+import numpy as np
+import pytest
+import torch
+import torch.fx as fx
+
+from nirtorch.from_nir import load
+from nirtorch.to_fx import graph_executor_to_fx
+
+from .test_from_nir import _Integrator, _torch_model_map
+
+
+class _CubaLIF(torch.nn.Module):
+    def forward(self, x, state=None):
+        if state is None:
+            state = (torch.zeros_like(x), torch.zeros_like(x))
+        v, i = state
+        i = 0.5 * i + x
+        v = 0.9 * v + i
+        z = (v > 1).float()
+        return z, (v * (1 - z), i)
+
+
+def _stateful_model_map(m):
+    if isinstance(m, nir.CubaLIF):
+        return _CubaLIF()
+    elif isinstance(m, nir.I):
+        return _Integrator()
+    return _torch_model_map(m)
+
+
+def _braille_graph():
+    return nir.read("tests/braille.nir")
+
+
+def test_fx_requires_sample_data():
+    with pytest.raises(ValueError):
+        load(_braille_graph(), _stateful_model_map, as_fx=True)
+
+
+def test_fx_braille_matches_executor():
+    data = torch.rand(10, 2, 12) * 2
+    executor = load(_braille_graph(), _stateful_model_map)
+    module = load(
+        _braille_graph(), _stateful_model_map, as_fx=True, sample_data=data[0]
+    )
+    assert isinstance(module, fx.GraphModule)
+    assert len(module.state_names) == 5  # 2 * (v, i) + recurrent w_rec output
+    # Share the modules, and hence the weights, with the executor
+    module = graph_executor_to_fx(executor, data[0])
+
+    state, flat_state = None, module.initial_state()
+    for data_t in data:
+        expected, state = executor(data_t, state)
+        actual, *flat_state = module(data_t, *flat_state)
+        assert torch.allclose(actual, expected)
+    for actual, expected in zip(flat_state, module.flatten_state(state)):
+        assert torch.allclose(actual, expected)
+
+
+def test_fx_fan_in_and_tensor_state():
+    w = np.ones((1, 1))
+    g = nir.NIRGraph(
+        nodes={
+            "in": nir.Input(np.ones(1)),
+            "a": nir.Linear(w),
+            "b": nir.Linear(w),
+            "c": nir.I(np.ones(1)),
+        },
+        edges=[("in", "a"), ("in", "b"), ("a", "c"), ("b", "c"), ("c", "a")],
+    )
+    executor = load(g, _stateful_model_map)
+    data = torch.ones(1, 1)
+    module = graph_executor_to_fx(executor, data)
+    assert module.state_names == ["c_state_0", "c_cache"]
+
+    state = None
+    flat_state = module.initial_state()
+    for _ in range(3):
+        expected, state = executor(data, state)
+        actual, *flat_state = module(data, *flat_state)
+        assert torch.allclose(actual, expected)
+    assert module.code.count("+") >= 2  # Fan-in sums are inlined
+
+
+def test_fx_without_state():
+    g = nir.NIRGraph(
+        nodes={"in": nir.Input(np.ones(1)), "a": nir.Linear(np.ones((1, 1)))},
+        edges=[("in", "a")],
+    )
+    data = torch.ones(1, 1)
+    module = load(g, _torch_model_map, return_state=False, as_fx=True, sample_data=data)
+    assert module.initial_state() == ()
+    assert torch.allclose(module(data), data)
+
+
+def test_torchscript_braille():
+    data = torch.rand(10, 2, 12) * 2
+    executor = load(_braille_graph(), _stateful_model_map)
+    module = graph_executor_to_fx(executor, data[0])
+    scripted = module.to_torchscript(data[0])
+    assert isinstance(scripted, torch.jit.ScriptModule)
+
+    state, flat_state = None, module.initial_state()
+    for data_t in data:
+        expected, state = executor(data_t, state)
+        actual, *flat_state = scripted(data_t, *flat_state)
+        assert torch.allclose(actual, expected)
+
+    # The executor can be compiled directly
+    scripted = executor.to_torchscript(data[0], freeze=False)
+    actual, *_ = scripted(data[0], *module.initial_state())
+    assert actual.shape == (2, 7)
+
+
+def test_torchscript_requires_tensor_state():
+    class _ConstantState(torch.nn.Module):
+        def forward(self, x, state=None):
+            return x, 1
+
+    g = nir.NIRGraph(
+        nodes={"in": nir.Input(np.ones(1)), "a": nir.I(np.ones(1))},
+        edges=[("in", "a")],
+    )
+    executor = load(g, lambda m: _ConstantState() if isinstance(m, nir.I) else None)
+    with pytest.raises(ValueError):
+        executor.to_torchscript(torch.ones(1, 1))
+
+
+def test_export_braille():
+    data = torch.rand(5, 2, 12) * 2
+    executor = load(_braille_graph(), _stateful_model_map)
+    module = graph_executor_to_fx(executor, data[0])
+    program = torch.export.export(module, (data[0], *module.initial_state()))
+    assert isinstance(program, torch.export.ExportedProgram)
+
+    # Save and load the program without the graph
+    buffer = io.BytesIO()
+    torch.export.save(program, buffer)
+    buffer.seek(0)
+    exported = torch.export.load(buffer).module()
+
+    state, flat_state = None, module.initial_state()
+    for data_t in data:
+        expected, state = executor(data_t, state)
+        actual, *flat_state = exported(data_t, *flat_state)
+        assert torch.allclose(actual, expected)
+
+
+def test_export_dynamic_batch():
+    executor = load(_braille_graph(), _stateful_model_map)
+    program = executor.export(torch.rand(2, 12), dynamic_batch=True)
+    # The state layout is (lif1 v, lif1 i, lif2 v, lif2 i, w_rec output)
+    state = [torch.zeros(3, 38), torch.zeros(3, 38)]
+    state += [torch.zeros(3, 7), torch.zeros(3, 7), torch.zeros(3, 38)]
+    output, *_ = program.module()(torch.rand(3, 12), *state)
+    assert output.shape == (3, 7)
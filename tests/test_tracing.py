@@ -0,0 +1,50 @@
+import json
+
+import nir
+import torch
+
+import nirtorch
+from nirtorch.tracing import Tracer, trace
+
+from .test_from_nir import _recurrent_model_map
+
+
+def test_trace_load_and_execute(tmp_path):
+    with trace() as tracer:
+        m = nirtorch.load("tests/braille.nir", _recurrent_model_map)
+        with m.profile(tracer=tracer):
+            m.forward_sequence(torch.rand(3, 2, 12))
+    # Nothing is recorded after the context
+    nirtorch.load("tests/braille.nir", _recurrent_model_map)
+
+    names = [event["name"] for event in tracer.events if event["cat"] == "load"]
+    assert names == ["read", "model_map", "graph", "plan"]
+    steps = [event for event in tracer.events if event["cat"] == "executor"]
+    assert len(steps) == 3
+    nodes = [event for event in tracer.events if event["cat"] == "node"]
+    assert len(nodes) == 3 * len(m.plan)
+    # The node calls are nested within their step
+    end = steps[0]["ts"] + steps[0]["dur"]
+    first = [event for event in nodes if event["ts"] < end]
+    assert all(event["ts"] >= steps[0]["ts"] for event in first)
+    assert len(first) == len(m.plan)
+
+    path = tmp_path / "trace.json"
+    tracer.save(path)
+    with open(path) as f:
+        events = json.load(f)["traceEvents"]
+    assert len(events) == len(tracer.events)
+    assert all(event["ph"] == "X" and event["dur"] >= 0 for event in events)
+
+
+def test_trace_extract_nir_graph():
+    model = torch.nn.Sequential(torch.nn.Linear(2, 3), torch.nn.Linear(3, 1))
+
+    def _map(module):
+        return nir.Affine(module.weight.detach().numpy(), module.bias.detach().numpy())
+
+    tracer = Tracer()
+    with trace(tracer):
+        nirtorch.extract_nir_graph(model, _map, torch.rand(1, 2))
+    names = [event["name"] for event in tracer.events]
+    assert names == ["extract_torch_graph", "model_map", "edges"]